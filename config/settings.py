@@ -4,52 +4,135 @@ Gestisce variabili d'ambiente e validazione per trading azioni.
 """
 
 import os
-from typing import Dict, Any, List
+import atexit
+import queue
+import logging
+import functools
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, List, Callable
+import numpy as np
 from dotenv import load_dotenv
 
 # Carica variabili d'ambiente
 load_dotenv()
 
+# Snapshot unico dell'ambiente: evita lookup ripetuti su os.environ
+_ENV: Dict[str, str] = dict(os.environ)
+
+
+def _get(key: str, default: Any, cast: Callable[[Any], Any] = str) -> Any:
+    """Legge una variabile dallo snapshot dell'ambiente applicando il cast."""
+    return cast(_ENV.get(key, default))
+
 
 class TradingConfig:
     """Configurazione principale del sistema trading azionario."""
     
     # API Keys
-    FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY', '')
-    LLM_API_KEY = os.getenv('LLM_API_KEY', '')
+    FINNHUB_API_KEY: str
+    LLM_API_KEY: str
     
     # LLM Configuration
-    LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'https://api.deepseek.com')
-    LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME', 'deepseek-chat')
+    LLM_BASE_URL: str
+    LLM_MODEL_NAME: str
     
     # IBKR Configuration per azioni
-    IBKR_HOST = os.getenv('IBKR_HOST', '127.0.0.1')
-    IBKR_PORT = int(os.getenv('IBKR_PORT', 7497))
-    IBKR_CLIENT_ID = int(os.getenv('IBKR_CLIENT_ID', 1))
+    IBKR_HOST: str
+    IBKR_PORT: int
+    IBKR_CLIENT_ID: int
     
     # Uncertainty Weights
-    WEIGHT_PROBABILITY = float(os.getenv('WEIGHT_PROBABILITY', 0.3))
-    WEIGHT_PLAUSIBILITY = float(os.getenv('WEIGHT_PLAUSIBILITY', 0.25))
-    WEIGHT_CREDIBILITY = float(os.getenv('WEIGHT_CREDIBILITY', 0.25))
-    WEIGHT_POSSIBILITY = float(os.getenv('WEIGHT_POSSIBILITY', 0.2))
+    WEIGHT_PROBABILITY: float
+    WEIGHT_PLAUSIBILITY: float
+    WEIGHT_CREDIBILITY: float
+    WEIGHT_POSSIBILITY: float
     
-    RELIABILITY_THRESHOLD = float(os.getenv('RELIABILITY_THRESHOLD', 0.6))
+    RELIABILITY_THRESHOLD: float
+
+    # Valori derivati, calcolati una volta in reload()
+    WEIGHTS_ARRAY: np.ndarray  # [Pr, Pl, Cr, Po]
+    TOTAL_WEIGHT: float
+    WEIGHTS_VALID: bool
+    THRESHOLD_VALID: bool
 
     # Position Size Settings
-    BASE_POSITION_SIZE = float(os.getenv('BASE_POSITION_SIZE', '100'))
-    MAX_POSITION_SIZE = float(os.getenv('MAX_POSITION_SIZE', '500'))
-    MIN_POSITION_SIZE = float(os.getenv('MIN_POSITION_SIZE', '10'))
+    BASE_POSITION_SIZE: float
+    MAX_POSITION_SIZE: float
+    MIN_POSITION_SIZE: float
     
     # System Configuration
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVEL: str
     
     # Flask Configuration
-    FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
-    FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
-    FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'true').lower() == 'true'
+    FLASK_HOST: str
+    FLASK_PORT: int
+    FLASK_DEBUG: bool
+
+    @classmethod
+    def reload(cls) -> None:
+        """
+        Ricostruisce lo snapshot dell'ambiente e rilegge tutti i valori.
+        Utile nei test dopo aver modificato os.environ.
+        """
+        global _ENV
+        _ENV = dict(os.environ)
+
+        cls.FINNHUB_API_KEY = _get('FINNHUB_API_KEY', '')
+        cls.LLM_API_KEY = _get('LLM_API_KEY', '')
+
+        cls.LLM_BASE_URL = _get('LLM_BASE_URL', 'https://api.deepseek.com')
+        cls.LLM_MODEL_NAME = _get('LLM_MODEL_NAME', 'deepseek-chat')
+
+        cls.IBKR_HOST = _get('IBKR_HOST', '127.0.0.1')
+        cls.IBKR_PORT = _get('IBKR_PORT', 7497, int)
+        cls.IBKR_CLIENT_ID = _get('IBKR_CLIENT_ID', 1, int)
+
+        cls.WEIGHT_PROBABILITY = _get('WEIGHT_PROBABILITY', 0.3, float)
+        cls.WEIGHT_PLAUSIBILITY = _get('WEIGHT_PLAUSIBILITY', 0.25, float)
+        cls.WEIGHT_CREDIBILITY = _get('WEIGHT_CREDIBILITY', 0.25, float)
+        cls.WEIGHT_POSSIBILITY = _get('WEIGHT_POSSIBILITY', 0.2, float)
+
+        cls.RELIABILITY_THRESHOLD = _get('RELIABILITY_THRESHOLD', 0.6, float)
+
+        cls.WEIGHTS_ARRAY = np.array([
+            cls.WEIGHT_PROBABILITY,
+            cls.WEIGHT_PLAUSIBILITY,
+            cls.WEIGHT_CREDIBILITY,
+            cls.WEIGHT_POSSIBILITY
+        ], dtype=np.float64)
+
+        # I pesi devono sommare a 1, la soglia deve stare in [0,1]
+        cls.TOTAL_WEIGHT = (cls.WEIGHT_PROBABILITY +
+                            cls.WEIGHT_PLAUSIBILITY +
+                            cls.WEIGHT_CREDIBILITY +
+                            cls.WEIGHT_POSSIBILITY)
+        cls.WEIGHTS_VALID = abs(cls.TOTAL_WEIGHT - 1.0) <= 0.01
+        cls.THRESHOLD_VALID = 0.0 <= cls.RELIABILITY_THRESHOLD <= 1.0
+
+        cls.BASE_POSITION_SIZE = _get('BASE_POSITION_SIZE', '100', float)
+        cls.MAX_POSITION_SIZE = _get('MAX_POSITION_SIZE', '500', float)
+        cls.MIN_POSITION_SIZE = _get('MIN_POSITION_SIZE', '10', float)
+
+        cls.LOG_LEVEL = _get('LOG_LEVEL', 'INFO')
 
+        cls.FLASK_HOST = _get('FLASK_HOST', '0.0.0.0')
+        cls.FLASK_PORT = _get('FLASK_PORT', 5000, int)
+        cls.FLASK_DEBUG = _get('FLASK_DEBUG', 'true').lower() == 'true'
+
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Svuota le cache di get_config() e validate_config()."""
+        get_config.cache_clear()
+        validate_config.cache_clear()
+
+@functools.lru_cache(maxsize=1)
 def get_config() -> Dict[str, Any]:
-    """Restituisce configurazione sistema trading azionario."""
+    """
+    Restituisce configurazione sistema trading azionario.
+    Il risultato è memoizzato: non va modificato dal chiamante.
+    """
     return {
         'api_keys': {
             'finnhub': TradingConfig.FINNHUB_API_KEY,
@@ -85,8 +168,12 @@ def get_config() -> Dict[str, Any]:
     }
 
 
+@functools.lru_cache(maxsize=1)
 def validate_config() -> Dict[str, List[str]]:
-    """Valida configurazione sistema trading azionario."""
+    """
+    Valida configurazione sistema trading azionario.
+    Il risultato è memoizzato: non va modificato dal chiamante.
+    """
     errors = []
     warnings = []
     
@@ -98,15 +185,10 @@ def validate_config() -> Dict[str, List[str]]:
         warnings.append("LLM_API_KEY non configurata - sentiment analysis disabilitato")
     
     # Valida pesi (devono sommare a 1)
-    total_weight = (TradingConfig.WEIGHT_PROBABILITY + 
-                   TradingConfig.WEIGHT_PLAUSIBILITY + 
-                   TradingConfig.WEIGHT_CREDIBILITY + 
-                   TradingConfig.WEIGHT_POSSIBILITY)
-    
-    if abs(total_weight - 1.0) > 0.01:
-        errors.append(f"I pesi degli indici non sommano a 1.0 (attuale: {total_weight:.3f})")
+    if not TradingConfig.WEIGHTS_VALID:
+        errors.append(f"I pesi degli indici non sommano a 1.0 (attuale: {TradingConfig.TOTAL_WEIGHT:.3f})")
     
-    if TradingConfig.RELIABILITY_THRESHOLD < 0.0 or TradingConfig.RELIABILITY_THRESHOLD > 1.0:
+    if not TradingConfig.THRESHOLD_VALID:
         errors.append(f"RELIABILITY_THRESHOLD deve essere tra 0.0 e 1.0 (attuale: {TradingConfig.RELIABILITY_THRESHOLD})")
     
     if TradingConfig.RELIABILITY_THRESHOLD < 0.5:
@@ -160,4 +242,34 @@ def print_config_summary():
             print(f"  - {warning}")
     
     if not validation['errors'] and not validation['warnings']:
-        print("\nConfigurazione sistema trading azionario OK") 
\ No newline at end of file
+        print("\nConfigurazione sistema trading azionario OK")
+
+
+
+_log_listener = None
+
+
+def setup_logging():
+    """
+    Configura il logging del sistema secondo TradingConfig.LOG_LEVEL.
+    I thread accodano i record su una coda; un QueueListener in background
+    li scrive su stderr, così l'I/O non blocca le richieste HTTP.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(TradingConfig.LOG_LEVEL.upper())
+
+    _log_listener = QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+# Valori letti una sola volta all'import
+TradingConfig.reload()
@@ -3,87 +3,154 @@ Server Flask API per ricezione segnali da MetaTrader 4.
 Espone endpoints REST per comunicazione diretta con strategia MQL4.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from dotenv import load_dotenv
+import orjson
 import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from itertools import count, islice
 
 from uncertainty.reliability import ReliabilityCalculator
 from trading.position_manager import PositionManager
 from trading.signal_processor import SignalProcessor
-from config.settings import TradingConfig
+from config.settings import TradingConfig, get_config, setup_logging
 from utils.technical_analysis import Signal
 
-# Carica le variabili d'ambiente
-load_dotenv()
+# Le variabili d'ambiente (.env) sono caricate una sola volta da config.settings
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Provider JSON basato su orjson per serializzare le risposte API."""
+
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs) -> str:
+        option = self._OPTIONS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # Inizializza i componenti principali
 position_manager = PositionManager()
 signal_processor = SignalProcessor()
+reliability_calculator = ReliabilityCalculator()
+
+# Campi obbligatori di un segnale MT4
+REQUIRED_SIGNAL_FIELDS = frozenset({
+    'direction', 'ticker', 'entry_price', 'stop_loss', 'take_profit',
+    'confidence', 'strength', 'timeframe', 'timestamp', 'magic_number'
+})
+_REQUIRED_SIGNAL_FIELDS_SORTED = sorted(REQUIRED_SIGNAL_FIELDS)
+
+# Campi convertiti a float prima dell'analisi
+NUMERIC_SIGNAL_FIELDS = ('entry_price', 'stop_loss', 'take_profit', 'confidence', 'strength')
+
+# Direzioni che possono aprire una posizione
+TRADABLE_DIRECTIONS = frozenset({'BUY', 'SELL'})
+
+
+@dataclass(slots=True)
+class SignalEntry:
+    """Segnale ricevuto con esito dell'analisi, come esposto da /api/state."""
+    timestamp: float
+    ticker: str
+    direction: str
+    entry_price: float
+    stop_loss: float
+    take_profit: float
+    reliability_score: Optional[float]  # None se la reliability non è stata calcolata
+    reliability_details: Dict[str, Any]
+    position_opened: bool
+    position_details: Dict[str, Any]
+
 
 # Semplifichiamo app_state per tracciare solo segnali e posizioni
 app_state = {
-    'signals': [],  # Lista degli ultimi segnali ricevuti
-    'positions': [], # Lista delle posizioni aperte
+    'signals': deque(maxlen=1000),  # Ultimi 1000 segnali ricevuti
+    'positions': {}, # Posizioni aperte indicizzate per order_id (o chiave locale)
     'last_update': time.time(),
     'total_signals_received': 0,
     'positions_opened': 0,
     'positions_rejected': 0
 }
 
+# Versione di app_state, incrementata a ogni aggiornamento, e ultima
+# risposta /api/state serializzata come (versione, bytes)
+_state_version = 0
+_state_cache = (-1, b'')
+
+# Serializza aggiornamenti di app_state e ricostruzione della risposta
+# /api/state tra i thread del server (gthread/waitress)
+_state_lock = threading.Lock()
+
+# Chiavi locali per le posizioni aperte senza order_id del broker
+_local_position_ids = count(1)
+
 def update_app_state(signal_data: dict, reliability_data: dict, position_result: dict):
     """
     Aggiorna app_state con nuovo segnale e risultato posizione
     """
-    app_state['total_signals_received'] += 1
+    global _state_version
+    with _state_lock:
+        app_state['total_signals_received'] += 1
     
-    # Crea entry per il segnale
-    signal_entry = {
-        'timestamp': time.time(),
-        'ticker': signal_data['ticker'],
-        'direction': signal_data['direction'],
-        'entry_price': signal_data['entry_price'],
-        'stop_loss': signal_data['stop_loss'],
-        'take_profit': signal_data['take_profit'],
-        'reliability_score': reliability_data['reliability'],
-        'reliability_details': {
-            'probability': reliability_data['probability'],
-            'plausibility': reliability_data['plausibility'],
-            'credibility': reliability_data['credibility'],
-            'possibility': reliability_data['possibility']
-        },
-        'position_opened': position_result['success'],
-        'position_details': position_result
-    }
+        # Crea entry per il segnale
+        signal_entry = SignalEntry(
+            timestamp=time.time(),
+            ticker=signal_data['ticker'],
+            direction=signal_data['direction'],
+            entry_price=signal_data['entry_price'],
+            stop_loss=signal_data['stop_loss'],
+            take_profit=signal_data['take_profit'],
+            reliability_score=reliability_data['reliability'],
+            reliability_details=reliability_data,
+            position_opened=position_result['success'],
+            position_details=position_result
+        )
     
-    # Aggiungi alla lista segnali (mantieni ultimi 1000)
-    app_state['signals'].append(signal_entry)
-    if len(app_state['signals']) > 1000:
-        app_state['signals'] = app_state['signals'][-1000:]
+        # Aggiungi alla lista segnali (la deque scarta i più vecchi oltre 1000)
+        app_state['signals'].append(signal_entry)
     
-    # Aggiorna contatori
-    if position_result['success']:
-        app_state['positions_opened'] += 1
-        # Aggiorna lista posizioni attive
-        position = {
-            'ticker': signal_data['ticker'],
-            'direction': signal_data['direction'],
-            'entry_price': position_result.get('fill_price', signal_data['entry_price']),
-            'stop_loss': signal_data['stop_loss'],
-            'take_profit': signal_data['take_profit'],
-            'shares': position_result.get('shares', 0),
-            'order_id': position_result.get('order_id', ''),
-            'open_time': time.time(),
-            'reliability_score': reliability_data['reliability']
-        }
-        app_state['positions'].append(position)
-    else:
-        app_state['positions_rejected'] += 1
+        # Aggiorna contatori
+        if position_result['success']:
+            app_state['positions_opened'] += 1
+            # Aggiorna lista posizioni attive
+            position = {
+                'ticker': signal_data['ticker'],
+                'direction': signal_data['direction'],
+                'entry_price': position_result.get('fill_price', signal_data['entry_price']),
+                'stop_loss': signal_data['stop_loss'],
+                'take_profit': signal_data['take_profit'],
+                'shares': position_result.get('shares', 0),
+                'order_id': position_result.get('order_id', ''),
+                'open_time': time.time(),
+                'reliability_score': reliability_data['reliability']
+            }
+            # Senza order_id si usa una chiave locale univoca, per non
+            # sovrascrivere altre posizioni sotto la stessa chiave vuota
+            position_key = position['order_id'] or f"local-{next(_local_position_ids)}"
+            app_state['positions'][position_key] = position
+        else:
+            app_state['positions_rejected'] += 1
     
-    app_state['last_update'] = time.time()
+        app_state['last_update'] = time.time()
+        _state_version += 1
 
 @app.route('/')
 def index():
@@ -101,46 +168,80 @@ def receive_signal():
     try:
         # raw = request.data.decode('utf-8', errors='replace')
         
-        signal_data = request.get_json()
+        signal_data = request.get_json(silent=True)
         
-        # Validazione campi obbligatori
-        required_fields = ['direction', 'ticker', 'entry_price', 'stop_loss', 'take_profit', 'confidence', 'strength', 'timeframe', 'timestamp', 'magic_number']
-        missing_fields = [field for field in required_fields if field not in signal_data]
+        # Il corpo deve essere un oggetto JSON (non lista, stringa o null)
+        if not isinstance(signal_data, dict):
+            return jsonify({
+                'error': 'Il segnale deve essere un oggetto JSON',
+                'required_fields': _REQUIRED_SIGNAL_FIELDS_SORTED
+            }), 400
+        
+        # Validazione campi obbligatori (unico punto di validazione del segnale)
+        missing_fields = sorted(REQUIRED_SIGNAL_FIELDS - signal_data.keys())
         
         if missing_fields:
             return jsonify({
                 'error': f'Campi mancanti: {missing_fields}',
-                'required_fields': required_fields
+                'required_fields': _REQUIRED_SIGNAL_FIELDS_SORTED
+            }), 400
+        
+        # Conversione unica dei campi numerici
+        try:
+            for field in NUMERIC_SIGNAL_FIELDS:
+                signal_data[field] = float(signal_data[field])
+        except (TypeError, ValueError):
+            return jsonify({
+                'error': f'Campo numerico non valido: {field}',
+                'numeric_fields': list(NUMERIC_SIGNAL_FIELDS)
             }), 400
             
-        print(f"\n--- SEGNALE RICEVUTO ---")
-        print(f"Ticker: {signal_data['ticker']}")
-        print(f"Direction: {signal_data['direction']}")
-        print(f"Entry Price: {signal_data['entry_price']}")
-        print(f"Confidence: {signal_data['confidence']}")
-        print(f"Strategy Strength: {signal_data['strength']}")
-        print(f"Magic Number: {signal_data['magic_number']}")
-        print(f"Timestamp: {signal_data['timestamp']}")
+        logger.info(
+            "SEGNALE RICEVUTO - Ticker: %s, Direction: %s, Entry Price: %s, Confidence: %s, "
+            "Strategy Strength: %s, Magic Number: %s, Timestamp: %s",
+            signal_data['ticker'], signal_data['direction'], signal_data['entry_price'],
+            signal_data['confidence'], signal_data['strength'], signal_data['magic_number'],
+            signal_data['timestamp']
+        )
         
-        # Inizializza ReliabilityCalculator con signal_data
-        reliability_calc = ReliabilityCalculator(signal_data)
+        # HOLD, CLOSE, ERROR non aprono posizioni: inutile calcolare la reliability,
+        # ma il segnale viene comunque registrato in app_state
+        if signal_data['direction'] not in TRADABLE_DIRECTIONS:
+            message = f"Segnale {signal_data['direction']} - nessuna operazione"
+            update_app_state(signal_data, {'reliability': None}, {'success': False, 'error': message})
+            return jsonify({
+                'success': False,
+                'message': message
+            })
         
         # Calcola reliability
-        reliability_data = reliability_calc.calculate_reliability(signal_data)
+        reliability_data = reliability_calculator.calculate_reliability(
+            signal_data, threshold=TradingConfig.RELIABILITY_THRESHOLD
+        )
         
-        print(f"\n--- ANALISI RELIABILITY ---")
-        print(f"Probability: {reliability_data['probability']:.3f}")
-        print(f"Plausibility: {reliability_data['plausibility']:.3f}")
-        print(f"Credibility: {reliability_data['credibility']:.3f}")
-        print(f"Possibility: {reliability_data['possibility']:.3f}")
-        print(f"Reliability Score: {reliability_data['reliability']:.3f}")
-        print(f"Threshold: {TradingConfig.RELIABILITY_THRESHOLD}")
+        reliability = reliability_data['reliability']
+        if reliability_data.get('short_circuited'):
+            # Pl, Cr e Po non calcolati: la reliability massima è già sotto soglia
+            logger.info(
+                "ANALISI RELIABILITY - Probability: %.3f, Reliability massima: %.3f, Threshold: %s "
+                "(analisi interrotta)",
+                reliability_data['probability'], reliability_data['max_reliability'],
+                TradingConfig.RELIABILITY_THRESHOLD
+            )
+        else:
+            logger.info(
+                "ANALISI RELIABILITY - Probability: %.3f, Plausibility: %.3f, Credibility: %.3f, "
+                "Possibility: %.3f, Reliability Score: %.3f, Threshold: %s",
+                reliability_data['probability'], reliability_data['plausibility'],
+                reliability_data['credibility'], reliability_data['possibility'],
+                reliability, TradingConfig.RELIABILITY_THRESHOLD
+            )
         
         # Inizializza risultato posizione
         position_result = {'success': False, 'error': 'Reliability troppo bassa'}
         
         # Se affidabile, processa il segnale e apri posizione
-        if reliability_data['reliability'] >= TradingConfig.RELIABILITY_THRESHOLD:
+        if reliability is not None and reliability >= TradingConfig.RELIABILITY_THRESHOLD:
             # Processa il segnale
             processed_signal = signal_processor.process_signal(signal_data, reliability_data)
             
@@ -149,13 +250,13 @@ def receive_signal():
                 position_result = position_manager.open_position(processed_signal)
                 
                 if position_result['success']:
-                    print(f"\n--- POSIZIONE APERTA ---")
-                    print(f"Order ID: {position_result['order_id']}")
-                    print(f"Fill Price: {position_result['fill_price']}")
-                    print(f"Shares: {position_result['shares']}")
+                    logger.info(
+                        "POSIZIONE APERTA - Order ID: %s, Fill Price: %s, Shares: %s",
+                        position_result['order_id'], position_result['fill_price'],
+                        position_result['shares']
+                    )
                 else:
-                    print(f"\n--- POSIZIONE RIFIUTATA ---")
-                    print(f"Errore: {position_result['error']}")
+                    logger.warning("POSIZIONE RIFIUTATA - Errore: %s", position_result['error'])
             else:
                 position_result = {
                     'success': False,
@@ -184,37 +285,52 @@ def receive_signal():
             })
         
     except Exception as e:
-        print(f"Errore processing segnale: {e}")
+        logger.exception("Errore processing segnale: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/state')
 def get_state():
-    """Restituisce stato corrente del sistema"""
-    return jsonify({
-        'system_status': 'active',
-        'total_signals_received': app_state['total_signals_received'],
-        'positions_opened': app_state['positions_opened'],
-        'positions_rejected': app_state['positions_rejected'],
-        'active_positions': len(app_state['positions']),
-        'last_signals': app_state['signals'][-10:] if app_state['signals'] else [],
-        'active_positions_details': app_state['positions'],
-        'last_update': app_state['last_update'],
-        'configuration': {
-            'reliability_threshold': TradingConfig.RELIABILITY_THRESHOLD,
-            'weights': {
-                'probability': TradingConfig.WEIGHT_PROBABILITY,
-                'plausibility': TradingConfig.WEIGHT_PLAUSIBILITY,
-                'credibility': TradingConfig.WEIGHT_CREDIBILITY,
-                'possibility': TradingConfig.WEIGHT_POSSIBILITY
-            }
-        }
-    })
+    """
+    Restituisce stato corrente del sistema.
+    Il JSON viene rigenerato solo quando app_state cambia (vedi _state_version).
+    """
+    global _state_cache
+    with _state_lock:
+        version = _state_version
+        if _state_cache[0] != version:
+            config = get_config()
+            signals = app_state['signals']
+            body = app.json.dumps({
+                'system_status': 'active',
+                'total_signals_received': app_state['total_signals_received'],
+                'positions_opened': app_state['positions_opened'],
+                'positions_rejected': app_state['positions_rejected'],
+                'active_positions': len(app_state['positions']),
+                'last_signals': list(islice(signals, max(0, len(signals) - 10), None)),
+                'active_positions_details': list(app_state['positions'].values()),
+                'last_update': app_state['last_update'],
+                'configuration': {
+                    'reliability_threshold': config['trading']['reliability_threshold'],
+                    'weights': config['weights']
+                }
+            }).encode('utf-8')
+            _state_cache = (version, body)
+        body = _state_cache[1]
+    return Response(body, mimetype='application/json')
 
 if __name__ == '__main__':
-    print("=== FINANCIAL COMPUTING SERVER ===")
-    print(f"Reliability Threshold: {TradingConfig.RELIABILITY_THRESHOLD}")
-    print(f"Weights - Pr:{TradingConfig.WEIGHT_PROBABILITY}, Pl:{TradingConfig.WEIGHT_PLAUSIBILITY}, Cr:{TradingConfig.WEIGHT_CREDIBILITY}, Po:{TradingConfig.WEIGHT_POSSIBILITY}")
-    print(f"Server starting on {TradingConfig.FLASK_HOST}:{TradingConfig.FLASK_PORT}")
+    logger.info("=== FINANCIAL COMPUTING SERVER ===")
+    logger.info("Reliability Threshold: %s", TradingConfig.RELIABILITY_THRESHOLD)
+    logger.info("Weights - Pr:%s, Pl:%s, Cr:%s, Po:%s",
+                TradingConfig.WEIGHT_PROBABILITY, TradingConfig.WEIGHT_PLAUSIBILITY,
+                TradingConfig.WEIGHT_CREDIBILITY, TradingConfig.WEIGHT_POSSIBILITY)
+    logger.info("Server starting on %s:%s", TradingConfig.FLASK_HOST, TradingConfig.FLASK_PORT)
+    
+    if not TradingConfig.FLASK_DEBUG:
+        logger.warning(
+            "Server di sviluppo Werkzeug in uso con FLASK_DEBUG=false: in produzione "
+            "avviare wsgi:app con gunicorn o waitress (vedi wsgi.py)"
+        )
     
     app.run(
         host=TradingConfig.FLASK_HOST,
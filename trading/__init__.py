@@ -1,12 +1,26 @@
 """
 Modulo per la gestione del trading.
 Include processamento segnali e gestione posizioni su Interactive Brokers.
+
+Le classi sono importate alla prima richiesta (PEP 562), così importare il
+package non carica ib_insync.
 """
 
-from .signal_processor import SignalProcessor
-from .position_manager import PositionManager
+import importlib
+
+_LAZY_IMPORTS = {
+    'SignalProcessor': '.signal_processor',
+    'PositionManager': '.position_manager'
+}
 
 __all__ = [
     'SignalProcessor',
     'PositionManager'
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,35 +3,83 @@ Gestore delle posizioni su Interactive Brokers - TRADING AZIONARIO.
 Sistema per trading di azioni su conto demo IBKR porta 7497.
 """
 
-import os
 from typing import Dict, Any, Optional
 from ib_insync import IB, Stock, MarketOrder
 import time
+import asyncio
+import threading
+import logging
 import nest_asyncio
+from concurrent.futures import ThreadPoolExecutor
 from config.settings import TradingConfig
 
-# Permette nested event loops
-nest_asyncio.apply()
+logger = logging.getLogger(__name__)
+
+# nest_asyncio viene applicato solo alla prima connessione IBKR
+_NEST_APPLIED = False
 
 
 class PositionManager:
-    """Gestisce le operazioni di trading azionario su Interactive Brokers Demo."""
+    """
+    Gestisce le operazioni di trading azionario su Interactive Brokers Demo.
+    
+    Singleton per processo: tutte le istanze condividono la stessa connessione
+    IBKR. La connessione parte in background alla creazione e tutte le
+    operazioni ib_insync girano su un unico thread dedicato, proprietario
+    dell'event loop della connessione.
+    """
+    
+    # Stati ordine dopo i quali non arrivano più aggiornamenti utili
+    _FINAL_STATUSES = frozenset({'Filled', 'Cancelled', 'ApiCancelled', 'Inactive'})
+    
+    # Secondi minimi tra due tentativi di riconnessione a IBKR
+    RECONNECT_COOLDOWN = 30
+    
+    _instance: Optional['PositionManager'] = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
     
     def __init__(self):
         """Inizializza il gestore posizioni per trading azionario."""
+        if self._initialized:
+            return
+        
         self.ib = None
-        self.host = os.getenv('IBKR_HOST', '127.0.0.1')
-        self.port = int(os.getenv('IBKR_PORT', 7497))  # Porta demo
-        self.client_id = int(os.getenv('IBKR_CLIENT_ID', 1))
+        self.host = TradingConfig.IBKR_HOST
+        self.port = TradingConfig.IBKR_PORT  # Porta demo
+        self.client_id = TradingConfig.IBKR_CLIENT_ID
         self.is_connected = False
         
-        # Connessione a IBKR Demo
-        self._connect()
+        # Contratti già qualificati, per ticker
+        self._contract_cache: Dict[str, Stock] = {}
+        
+        # Thread unico per le chiamate IBKR: serializza connessione e ordini
+        # provenienti dai thread Flask senza bloccare l'avvio del server
+        self._ib_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ibkr')
+        
+        # Riconnessioni in background: al più una in corso e una ogni RECONNECT_COOLDOWN secondi
+        self._reconnect_lock = threading.Lock()
+        self._reconnecting = False
+        self._last_connect_attempt = time.monotonic()
+        self._initial_connect = self._ib_executor.submit(self._connect)
+        self._initialized = True
         
     def _connect(self):
         """Connessione al conto demo IBKR per trading azionario."""
+        global _NEST_APPLIED
         try:
-            print(f"Connessione IBKR Demo (Stock Trading): {self.host}:{self.port}")
+            logger.info("Connessione IBKR Demo (Stock Trading): %s:%s", self.host, self.port)
+            
+            # Permette nested event loops (richiesto da ib_insync)
+            if not _NEST_APPLIED:
+                nest_asyncio.apply()
+                _NEST_APPLIED = True
             
             self.ib = IB()
             self.ib.connect(
@@ -42,23 +90,54 @@ class PositionManager:
             )
             
             self.is_connected = True
-            print(f"Connesso a IBKR Demo - Trading Azionario Attivo")
+            logger.info("Connesso a IBKR Demo - Trading Azionario Attivo")
             
             # Info account demo
             accounts = self.ib.managedAccounts()
-            print(f"Account Demo: {accounts[0] if accounts else 'N/A'}")
+            logger.info("Account Demo: %s", accounts[0] if accounts else 'N/A')
             
         except Exception as e:
-            print(f"Errore connessione IBKR: {e}")
-            print("Verificare:")
-            print("   - TWS Paper Trading attivo")
-            print("   - API abilitato su porta 7497")
-            print("   - Login demo completato")
+            logger.error(
+                "Errore connessione IBKR: %s. Verificare: TWS Paper Trading attivo, "
+                "API abilitato su porta %s, login demo completato", e, self.port
+            )
             self.is_connected = False
             self.ib = None
     
+    def _schedule_reconnect(self):
+        """Avvia una riconnessione sul thread IBKR se non ce n'è una in corso e il cooldown è scaduto."""
+        with self._reconnect_lock:
+            now = time.monotonic()
+            if self._reconnecting or now - self._last_connect_attempt < self.RECONNECT_COOLDOWN:
+                return
+            self._reconnecting = True
+            self._last_connect_attempt = now
+        self._ib_executor.submit(self._reconnect)
+    
+    def _reconnect(self):
+        """Tentativo di riconnessione (eseguito sul thread IBKR)."""
+        try:
+            if not self.is_connected:
+                self._connect()
+        finally:
+            with self._reconnect_lock:
+                self._reconnecting = False
+    
+    def _offline_result(self, signal: Dict[str, Any]) -> Dict[str, Any]:
+        """Esito di un ordine rifiutato perché IBKR non è connesso."""
+        return {
+            'success': False,
+            'error': 'IBKR Demo non connesso',
+            'ticker': signal.get('ticker', ''),
+            'action': signal.get('action', 'HOLD')
+        }
+    
     def test_connection(self) -> Dict[str, Any]:
         """Verifica connessione al broker per trading azionario."""
+        return self._ib_executor.submit(self._test_connection).result()
+    
+    def _test_connection(self) -> Dict[str, Any]:
+        """Interroga l'account IBKR (eseguito sul thread IBKR)."""
         if not self.is_connected or not self.ib:
             return {
                 'connected': False,
@@ -83,14 +162,21 @@ class PositionManager:
             }
     
     def open_position(self, signal: Dict[str, Any]) -> Dict[str, Any]:
-        """Apre posizione azionaria su IBKR Demo."""
+        """
+        Apre posizione azionaria su IBKR Demo.
+        Se la connessione iniziale è ancora in corso, attende solo il tempo residuo.
+        Se IBKR non è connesso l'ordine è rifiutato subito e la riconnessione
+        parte in background (vedi RECONNECT_COOLDOWN).
+        """
+        if not self.is_connected and self._initial_connect.done():
+            self._schedule_reconnect()
+            return self._offline_result(signal)
+        return self._ib_executor.submit(self._open_position, signal).result()
+    
+    def _open_position(self, signal: Dict[str, Any]) -> Dict[str, Any]:
+        """Invia l'ordine per la posizione azionaria (eseguito sul thread IBKR)."""
         if not self.is_connected or not self.ib:
-            return {
-                'success': False,
-                'error': 'IBKR Demo non connesso',
-                'ticker': signal.get('ticker', ''),
-                'action': signal.get('action', 'HOLD')
-            }
+            return self._offline_result(signal)
         
         try:
             ticker = signal.get('ticker', '')
@@ -114,11 +200,10 @@ class PositionManager:
                     'action': action
                 }
             
-            print(f"\nAPERTURA POSIZIONE AZIONARIA")
-            print(f"   {action} {ticker}")
-            print(f"   Prezzo: ${entry_price:.2f}")
-            print(f"   Stop Loss: ${stop_loss:.2f}")
-            print(f"   Take Profit: ${take_profit:.2f}")
+            logger.info(
+                "APERTURA POSIZIONE AZIONARIA - %s %s, Prezzo: $%.2f, Stop Loss: $%.2f, Take Profit: $%.2f",
+                action, ticker, entry_price, stop_loss, take_profit
+            )
             
             # Crea contratto azionario
             contract = self._create_stock_contract(ticker)
@@ -134,7 +219,7 @@ class PositionManager:
             order = MarketOrder(action, shares)
             order.tif = "DAY"  # Valido per la giornata
             
-            print(f"Invio ordine: {action} {shares} azioni {ticker}")
+            logger.info("Invio ordine: %s %s azioni %s", action, shares, ticker)
             
             # Invia ordine al mercato
             trade = self.ib.placeOrder(contract, order)
@@ -143,7 +228,7 @@ class PositionManager:
             self._wait_for_execution(trade, timeout=15)
             
             status = trade.orderStatus.status
-            print(f"Status ordine: {status}")
+            logger.info("Status ordine: %s", status)
             
             if status in ['Filled', 'PartFilled']:
                 # Ordine eseguito con successo
@@ -164,11 +249,11 @@ class PositionManager:
                     'status': 'EXECUTED'
                 }
                 
-                print(f"POSIZIONE AZIONARIA APERTA!")
-                print(f"   Order ID: {trade.order.orderId}")
-                print(f"   Prezzo esecuzione: ${fill_price:.2f}")
-                print(f"   Azioni: {shares}")
-                print(f"   Valore totale: ${total_value:.2f}")
+                logger.info(
+                    "POSIZIONE AZIONARIA APERTA - Order ID: %s, Prezzo esecuzione: $%.2f, "
+                    "Azioni: %s, Valore totale: $%.2f",
+                    trade.order.orderId, fill_price, shares, total_value
+                )
                 
                 return result
             else:
@@ -181,7 +266,9 @@ class PositionManager:
                 }
                 
         except Exception as e:
-            print(f"Errore apertura posizione azionaria: {e}")
+            logger.error("Errore apertura posizione azionaria: %s", e)
+            # Il contratto in cache potrebbe essere la causa: verrà riqualificato
+            self.invalidate_contract(signal.get('ticker', ''))
             return {
                 'success': False,
                 'error': str(e),
@@ -190,9 +277,13 @@ class PositionManager:
             }
     
     def _create_stock_contract(self, ticker: str) -> Optional[Stock]:
-        """Crea contratto per azione specifica."""
+        """Crea contratto per azione specifica (qualificato una sola volta per ticker)."""
+        cached = self._contract_cache.get(ticker)
+        if cached is not None:
+            return cached
+        
         try:
-            print(f"Creazione contratto azione: {ticker}")
+            logger.debug("Creazione contratto azione: %s", ticker)
             
             # Crea contratto stock standard USA
             contract = Stock(ticker, 'SMART', 'USD')
@@ -201,34 +292,53 @@ class PositionManager:
             qualified_contracts = self.ib.qualifyContracts(contract)
             
             if not qualified_contracts:
-                print(f"Azione {ticker} non trovata su IBKR")
+                logger.warning("Azione %s non trovata su IBKR", ticker)
                 return None
             
             qualified_contract = qualified_contracts[0]
-            print(f"Contratto qualificato: {qualified_contract.symbol}")
-            print(f"   Exchange: {qualified_contract.exchange}")
-            print(f"   Valuta: {qualified_contract.currency}")
+            logger.debug(
+                "Contratto qualificato: %s, Exchange: %s, Valuta: %s",
+                qualified_contract.symbol, qualified_contract.exchange, qualified_contract.currency
+            )
             
+            self._contract_cache[ticker] = qualified_contract
             return qualified_contract
             
         except Exception as e:
-            print(f"Errore creazione contratto {ticker}: {e}")
+            logger.error("Errore creazione contratto %s: %s", ticker, e)
             return None
     
+    def invalidate_contract(self, ticker: str):
+        """Rimuove il contratto del ticker dalla cache."""
+        self._contract_cache.pop(ticker, None)
+    
     def _wait_for_execution(self, trade, timeout: int = 15):
-        """Attende esecuzione ordine azionario."""
-        start_time = time.time()
-        print(f"Attesa esecuzione ordine (max {timeout}s)...")
+        """
+        Attende esecuzione ordine azionario.
+        Si sveglia sugli eventi di stato del trade invece di fare polling.
+        """
+        start_ns = time.monotonic_ns()
+        timeout_ns = timeout * 1_000_000_000
+        logger.debug("Attesa esecuzione ordine (max %ss)...", timeout)
         
-        while time.time() - start_time < timeout:
-            self.ib.sleep(0.1)  # Check ogni 100ms
-            
-            status = trade.orderStatus.status
-            if status in ['Filled', 'Cancelled', 'ApiCancelled', 'Inactive']:
-                break
+        async def _until_final_status():
+            while trade.orderStatus.status not in self._FINAL_STATUSES:
+                await trade.statusEvent
+        
+        try:
+            self.ib.run(_until_final_status(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            # Event loop non utilizzabile: ripiega sul polling per il tempo residuo
+            logger.warning("Attesa ad eventi non disponibile (%s), uso polling", e)
+            while time.monotonic_ns() - start_ns < timeout_ns:
+                self.ib.sleep(0.1)  # Check ogni 100ms
+                if trade.orderStatus.status in self._FINAL_STATUSES:
+                    break
                 
-        elapsed = time.time() - start_time
-        print(f"Attesa completata dopo {elapsed:.1f}s")
+        elapsed = (time.monotonic_ns() - start_ns) / 1e9
+        logger.debug("Attesa completata dopo %.1fs", elapsed)
     
     def get_positions_summary(self) -> Dict[str, Any]:
         """Riassunto posizioni azionarie."""
@@ -240,11 +350,15 @@ class PositionManager:
     
     def disconnect(self):
         """Disconnette da IBKR."""
+        self._ib_executor.submit(self._disconnect).result()
+    
+    def _disconnect(self):
+        """Chiude la connessione (eseguito sul thread IBKR)."""
         try:
             if self.is_connected and self.ib:
                 self.ib.disconnect()
-                print("Disconnesso da IBKR Demo")
+                logger.info("Disconnesso da IBKR Demo")
             self.is_connected = False
             self.ib = None
         except Exception as e:
-            print(f"Errore disconnessione: {e}")
+            logger.error("Errore disconnessione: %s", e)
@@ -5,8 +5,11 @@ Integra i segnali da MT4 con i punteggi di affidabilità per decisioni finali.
 
 from typing import Dict, Any
 import time
+import logging
 from config.settings import TradingConfig
 
+logger = logging.getLogger(__name__)
+
 class SignalProcessor:
     """
     Processa i segnali di trading integrando analisi di affidabilità.
@@ -19,6 +22,7 @@ class SignalProcessor:
     def process_signal(self, mt4_signal: Dict[str, Any], reliability_data: Dict[str, float]) -> Dict[str, Any]:
         """
         Processa un segnale MT4 con i dati di affidabilità.
+        Il segnale deve essere già validato (vedi server.REQUIRED_SIGNAL_FIELDS).
         
         Args:
             mt4_signal: Dict contenente:
@@ -40,11 +44,6 @@ class SignalProcessor:
             Dict con decisione finale e metadati
         """
         try:
-            # Validazione input
-            required_mt4_fields = ['ticker', 'direction', 'entry_price', 'stop_loss', 'take_profit']
-            if not all(k in mt4_signal for k in required_mt4_fields):
-                raise ValueError(f"Segnale MT4 mancante di campi richiesti: {required_mt4_fields}")
-            
             # Estrae dati base del segnale
             ticker = mt4_signal['ticker']
             direction = mt4_signal['direction']
@@ -75,7 +74,7 @@ class SignalProcessor:
             return processed_signal
             
         except Exception as e:
-            print(f"Errore processamento segnale: {e}")
+            logger.error("Errore processamento segnale: %s", e)
             return self._create_error_signal(mt4_signal, str(e))
     
     
@@ -1,13 +1,19 @@
 """
 Modulo per il calcolo degli indici di incertezza nel trading algoritmico.
 Comprende Affidabilità, Probabilità, Plausibilità, Credibilità e Possibilità.
+
+Gli analizzatori sono importati alla prima richiesta (PEP 562).
 """
 
-from .probability import ProbabilityAnalyzer
-from .plausibility import PlausibilityAnalyzer
-from .credibility import CredibilityAnalyzer
-from .possibility import PossibilityAnalyzer
-from .reliability import ReliabilityCalculator
+import importlib
+
+_LAZY_IMPORTS = {
+    'ProbabilityAnalyzer': '.probability',
+    'PlausibilityAnalyzer': '.plausibility',
+    'CredibilityAnalyzer': '.credibility',
+    'PossibilityAnalyzer': '.possibility',
+    'ReliabilityCalculator': '.reliability'
+}
 
 __all__ = [
     'ProbabilityAnalyzer',
@@ -15,4 +21,11 @@ __all__ = [
     'CredibilityAnalyzer',
     'PossibilityAnalyzer',
     'ReliabilityCalculator'
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
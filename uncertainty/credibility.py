@@ -2,18 +2,46 @@
 Credibilità (Cr): calcolata tramite sentiment analysis su notizie finanziarie istituzionali.
 """
 
-from typing import Dict, Any
+import re
+import logging
+import time
+from collections import Counter
+from typing import Dict, Any, Tuple
+import numpy as np
 from utils.finance_news import FinanceNews
-from utils.nlp_sentiment import NLPSentiment
+from utils.cache import FileCache, DEFAULT_CACHE
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_URL_RE = re.compile(r'https?://\S+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize_news_text(text: str) -> str:
+    """Forma canonica di una notizia per riconoscere i duplicati tra agenzie."""
+    return _WHITESPACE_RE.sub(' ', _URL_RE.sub('', text.lower())).strip()
+
 
 class CredibilityAnalyzer:
     """
     Calcola l'indice di credibilità basato sul sentiment delle notizie economiche.
     """
     
-    def __init__(self):
-        self.finance_news = FinanceNews()
-        self.nlp_sentiment = NLPSentiment()
+    # Validità in secondi della credibilità calcolata per un ticker
+    CACHE_TTL = 180
+    
+    def __init__(self, cache: FileCache = DEFAULT_CACHE):
+        """
+        Args:
+            cache: cache delle notizie condivisa con gli altri analizzatori
+        """
+        self.finance_news = FinanceNews(cache=cache)
+        # Stesso analizzatore (e stessa cache) usato da FinanceNews
+        self.nlp_sentiment = self.finance_news.nlp
+        
+        # ticker -> (credibilità, istante del calcolo da time.monotonic())
+        self._cache: Dict[str, Tuple[float, float]] = {}
         
     def calculate_credibility(self, ticker: str) -> float:
         """
@@ -25,6 +53,10 @@ class CredibilityAnalyzer:
         Returns:
             Valore di credibilità normalizzato [0,1]
         """
+        hit = self._cache.get(ticker)
+        if hit is not None and time.monotonic() - hit[1] < self.CACHE_TTL:
+            return hit[0]
+        
         try:
             # Ottiene notizie istituzionali
             news_data = self.finance_news.get_ticker_news(ticker, max_items=15)
@@ -32,24 +64,42 @@ class CredibilityAnalyzer:
             if not news_data:
                 return 0.5  # Valore neutro se non ci sono notizie
             
-            # Analizza sentiment
-            sentiments = []
+            # Notizie duplicate (stessa storia rilanciata da più fonti) analizzate
+            # una sola volta e pesate per il numero di occorrenze
+            counts = Counter()
+            texts = []
+            keys = []
             for news in news_data:
-                text = f"{news.get('headline', '')} {news.get('summary', '')}"
-                if text.strip():
-                    sentiment = self.nlp_sentiment.analyze_sentiment(text, ticker)
-                    sentiments.append(sentiment)
+                text = f"{news.get('headline', '')} {news.get('summary', '')}".strip()
+                key = _normalize_news_text(text)
+                if not key:
+                    continue
+                if key not in counts:
+                    texts.append(text)
+                    keys.append(key)
+                counts[key] += 1
             
-            if not sentiments:
+            if not texts:
                 return 0.5
+            
+            # Analizza sentiment di tutte le notizie in un'unica chiamata batch
+            try:
+                sentiments = self.nlp_sentiment.analyze_sentiment_batch(texts, ticker)
+            except Exception as e:
+                metrics.incr(f"{self.__class__.__name__}.batch_error")
+                logger.warning("Errore sentiment batch per %s, analisi per singola notizia: %s", ticker, e)
+                sentiments = [self.nlp_sentiment.analyze_sentiment(text, ticker) for text in texts]
                 
-            # Calcola sentiment medio
-            avg_sentiment = sum(sentiments) / len(sentiments)
+            # Calcola sentiment medio pesato per i duplicati
+            weights = [counts[key] for key in keys]
+            avg_sentiment = float(np.average(sentiments, weights=weights))
             
             # Normalizzazione sentiment medio tra 0 e 1 assumendo che il sentiment sia tra -1 e 1
             normalized_sentiment = (avg_sentiment + 1) / 2
+            self._cache[ticker] = (normalized_sentiment, time.monotonic())
             return normalized_sentiment
                 
-        except Exception as e:
-            print(f"Errore calcolo credibilità per {ticker}: {e}")
+        except Exception:
+            metrics.incr(f"{self.__class__.__name__}.error")
+            logger.exception("Errore calcolo credibilità per %s", ticker)
             return 0.5 
\ No newline at end of file
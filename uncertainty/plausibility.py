@@ -2,8 +2,29 @@
 Plausibilità (Pl): valutata tramite pattern candlestick confermativi.
 """
 
+import logging
 from typing import List, Dict
+import numpy as np
 from utils.technical_analysis import TechnicalAnalyzer, Signal, PatternType
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Mapping dei timeframe per analisi multiframe: timeframe segnale -> timeframe di conferma
+_TIMEFRAME_MAPPING = {
+    "1m": "5m",
+    "5m": "15m", 
+    "15m": "1h",
+    "30m": "4h",
+    "1h": "4h",
+    "4h": "1d"
+}
+
+# Coppie (segnale, tipo pattern) in cui il pattern conferma il segnale
+_CONFIRMATORY = frozenset({
+    (Signal.BUY, PatternType.BULLISH),
+    (Signal.SELL, PatternType.BEARISH)
+})
 
 class PlausibilityAnalyzer:
     """
@@ -18,18 +39,8 @@ class PlausibilityAnalyzer:
         """
         self.lookback = lookback
         
-        # Mapping dei timeframe per analisi multiframe
-        timeframe_mapping = {
-            "1m": "5m",
-            "5m": "15m", 
-            "15m": "1h",
-            "30m": "4h",
-            "1h": "4h",
-            "4h": "1d"
-        }
-        
         # Usa il timeframe di conferma in base al timeframe del segnale
-        confirmation_tf = timeframe_mapping.get(signal_timeframe, signal_timeframe)
+        confirmation_tf = _TIMEFRAME_MAPPING.get(signal_timeframe, signal_timeframe)
         
         self.analyzer = TechnicalAnalyzer(
             interval=confirmation_tf,
@@ -47,46 +58,43 @@ class PlausibilityAnalyzer:
             Plausibilità normalizzata [0,1]
         """
         try:
-            # Rileva pattern usando TechnicalAnalyzer
-            patterns = self.analyzer.detect_patterns(ticker)
+            # Rileva pattern usando TechnicalAnalyzer (array strutturato, una riga per occorrenza)
+            hits = self.analyzer.detect_pattern_hits(ticker)
             
-            if not patterns:
-                print(f"Nessun pattern rilevato per {ticker}")
+            if not len(hits):
+                logger.debug("Nessun pattern rilevato per %s", ticker)
                 return 0.5
             
-            # Considera solo gli ultimi N pattern
-            recent_patterns = sorted(patterns, key=lambda x: x['position'])[-self.lookback:]
+            # Considera solo gli ultimi N pattern: ordinamento stabile per posizione
+            # (a parità di posizione resta l'ordine di rilevamento)
+            recent = hits[np.argsort(hits['position'], kind='stable')[-self.lookback:]]
+            confirmatory = self._confirmatory_mask(recent['type'], signal)
             
-            # Log dei pattern trovati
-            print(f"\nPattern rilevati per {ticker} (ultimi {self.lookback}):")
-            for pattern in recent_patterns:
-                pattern_str = self.analyzer.format_pattern(pattern)
-                confirmatory = "✓" if self._is_confirmatory(pattern['type'], signal) else " "
-                print(f"  {confirmatory} {pattern_str}")
+            # Log dei pattern trovati (Pattern e formattazione solo se DEBUG attivo)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Pattern rilevati per %s (ultimi %s):", ticker, self.lookback)
+                formatted = self.analyzer.format_patterns(self.analyzer.to_patterns(recent))
+                for text, is_confirmatory in zip(formatted, confirmatory):
+                    mark = "✓" if is_confirmatory else " "
+                    logger.debug("  %s %s", mark, text)
             
-            # Calcola score con pesi decrescenti
-            score = 0.0
-            for i, pattern in enumerate(recent_patterns):
-                weight = 1.0 - (i / len(recent_patterns)) * 0.5  # da 1.0 a 0.5
-                
-                # Pattern confermativo nella direzione del segnale
-                if self._is_confirmatory(pattern['type'], signal):
-                    score += weight * pattern['strength']  # Usa la forza del pattern
-                # Pattern neutro
-                elif pattern['type'] == PatternType.NEUTRAL:
-                    score += 0.5 * weight
+            # Calcola score con pesi decrescenti da 1.0 a 0.5:
+            # pattern confermativo -> forza del pattern, pattern neutro -> 0.5
+            n = len(recent)
+            weights = 1.0 - np.arange(n) / n * 0.5
+            neutral = recent['type'] == PatternType.NEUTRAL.value
+            contributions = np.where(confirmatory, recent['strength'], np.where(neutral, 0.5, 0.0))
+            score = float(np.dot(weights, contributions))
 
-            print(f"\nPlausibilità finale per {ticker}: {score:.3f}")
+            logger.debug("Plausibilità finale per %s: %.3f", ticker, score)
             return min(1.0, score)
             
-        except Exception as e:
-            print(f"Errore calcolo plausibilità: {e}")
+        except Exception:
+            metrics.incr(f"{self.__class__.__name__}.error")
+            logger.exception("Errore calcolo plausibilità per %s", ticker)
             return 0.5
 
-    def _is_confirmatory(self, pattern_type: PatternType, signal: Signal) -> bool:
-        """Verifica se il pattern conferma il segnale."""
-        if signal == Signal.BUY and pattern_type == PatternType.BULLISH:
-            return True
-        if signal == Signal.SELL and pattern_type == PatternType.BEARISH:
-            return True
-        return False
\ No newline at end of file
+    def _confirmatory_mask(self, pattern_types: np.ndarray, signal: Signal) -> np.ndarray:
+        """Maschera dei pattern (valori di PatternType) che confermano il segnale."""
+        confirming = [pattern_type.value for confirmed, pattern_type in _CONFIRMATORY if confirmed == signal]
+        return np.isin(pattern_types, confirming)
\ No newline at end of file
@@ -2,9 +2,44 @@
 Possibilità (Po): valuta la stabilità del contesto in base agli eventi macroeconomici imminenti.
 """
 
+import logging
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 from utils.finance_news import FinanceNews
+from utils.cache import FileCache, DEFAULT_CACHE
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ScoreProfile:
+    """
+    Parametri di scoring della possibilità.
+
+    Uno score temporale viene assegnato a ogni evento futuro: time_scores[i]
+    se mancano più di time_thresholds[i] giorni (soglie decrescenti, vince la
+    prima soddisfatta), altrimenti default_time_score. Lo score viene poi
+    moltiplicato per il fattore di impatto dell'evento.
+    """
+    time_thresholds: Tuple[float, ...]
+    time_scores: Tuple[float, ...]
+    default_time_score: float
+    impact_multipliers: Dict[str, float]
+    default_impact_multiplier: float
+
+
+# Profilo per gli eventi del calendario investpy (date dd/mm/yyyy)
+DEFAULT_PROFILE = ScoreProfile(
+    time_thresholds=(3, 2, 1),
+    time_scores=(1.0, 0.9, 0.75),
+    default_time_score=0.6,
+    impact_multipliers={'high': 0.7, 'medium': 0.8, 'low': 0.9},
+    default_impact_multiplier=0.8
+)
+
 
 class PossibilityAnalyzer:
     """
@@ -12,27 +47,50 @@ class PossibilityAnalyzer:
     di eventi macroeconomici rilevanti nel calendario.
     """
     
-    def __init__(self):
-        """Inizializza l'analizzatore di possibilità."""
-        self.finance_news = FinanceNews()
+    # Validità in secondi della possibilità calcolata per un ticker
+    CACHE_TTL = 180
+    
+    def __init__(self, cache: FileCache = DEFAULT_CACHE, profile: ScoreProfile = DEFAULT_PROFILE):
+        """
+        Inizializza l'analizzatore di possibilità.
+
+        Args:
+            cache: cache del calendario economico condivisa con gli altri analizzatori
+            profile: soglie temporali e moltiplicatori di impatto dello scoring
+        """
+        self.finance_news = FinanceNews(cache=cache)
+        self.profile = profile
         
-    def calculate_possibility(self, ticker: str) -> float:
+        # ticker -> (possibilità, timestamp dell'istante di riferimento del calcolo)
+        self._cache: Dict[str, Tuple[float, float]] = {}
+        
+    def calculate_possibility(self, ticker: str, now: Optional[datetime] = None) -> float:
         """
         Calcola l'indice di possibilità [0,1] basato su eventi economici.
         
         Args:
             ticker: Simbolo del ticker
+            now: istante di riferimento (default: datetime.now()), utile per replay e test
             
         Returns:
             Possibilità normalizzata [0,1] dove:
             1.0 = nessun evento rilevante imminente
             0.0 = eventi ad alto impatto molto vicini
         """
+        # Istante di riferimento unico per cache, finestra di ricerca e giorni mancanti
+        if now is None:
+            now = datetime.now()
+        now_ts = now.timestamp()
+        
+        hit = self._cache.get(ticker)
+        if hit is not None and 0 <= now_ts - hit[1] < self.CACHE_TTL:
+            return hit[0]
+        
         try:
             # Recupera eventi dei prossimi 5 giorni
-            end_date = (datetime.now() + timedelta(days=5)).strftime('%Y-%m-%d')
+            end_date = (now + timedelta(days=5)).strftime('%Y-%m-%d')
             events = self.finance_news.get_economic_calendar_news(
-                start_date=datetime.now().strftime('%Y-%m-%d'),
+                start_date=now.strftime('%Y-%m-%d'),
                 end_date=end_date,
                 ticker=ticker
             )
@@ -40,52 +98,61 @@ class PossibilityAnalyzer:
             if not events:
                 return 1.0  # Nessun evento = massima possibilità
 
-            # Calcola score per ogni evento
-            scores = []
+            # Date evento valide e relativo moltiplicatore di impatto
+            profile = self.profile
+            event_dates = []
+            impact_multipliers = []
             for event in events:
-                # Calcola giorni mancanti
-                try:
-                    date_str = event.get('date', '')
-                    event_date = datetime.strptime(date_str, '%d/%m/%Y')
-                except:
+                event_date = self._parse_event_date(event.get('date', ''))
+                if event_date is None:
                     continue  # Salta evento se data non valida
+                event_dates.append(event_date)
+                impact = str(event.get('impact', '')).lower()
+                impact_multipliers.append(
+                    profile.impact_multipliers.get(impact, profile.default_impact_multiplier)
+                )
+
+            if not event_dates:
+                return 0.5
+
+            # Giorni mancanti a ogni evento, calcolati in blocco
+            days_until = (
+                (np.array(event_dates, dtype='datetime64[us]') - np.datetime64(now, 'us'))
+                / np.timedelta64(1, 'D')
+            )
 
-                days_until = (event_date - datetime.now()).total_seconds() / (24 * 3600)
-                
-                if days_until < 0:  # Evento passato
-                    continue
-
-                # Base score per temporalità
-                if days_until > 3:
-                    time_score = 1.0
-                elif days_until > 2:
-                    time_score = 0.9
-                elif days_until > 1:
-                    time_score = 0.75
-                else:
-                    time_score = 0.6
-
-                # Modifica per importanza evento
-                impact = event.get('impact', '').lower()
-                if impact == 'high':
-                    impact_multiplier = 0.7
-                elif impact == 'medium':
-                    impact_multiplier = 0.8
-                elif impact == 'low':
-                    impact_multiplier = 0.9
-                else:
-                    impact_multiplier = 0.8
-
-                final_score = time_score * impact_multiplier
-                scores.append(final_score)
-
-            if not scores:
+            # Eventi passati esclusi
+            upcoming = days_until >= 0
+            if not upcoming.any():
                 return 0.5
 
+            # Base score per temporalità, modificato per importanza evento
+            time_scores = np.select(
+                [days_until > threshold for threshold in profile.time_thresholds],
+                profile.time_scores,
+                default=profile.default_time_score
+            )
+            scores = time_scores * np.array(impact_multipliers)
+
             # Il più basso score determina la possibilità
-            possibility = min(scores)
-            return max(0.0, min(1.0, possibility))
+            possibility = float(np.clip(scores[upcoming].min(), 0.0, 1.0))
+            self._cache[ticker] = (possibility, now_ts)
+            return possibility
+
+        except Exception:
+            metrics.incr(f"{self.__class__.__name__}.error")
+            logger.exception("Errore calcolo possibilità per %s", ticker)
+            return 0.5
 
-        except Exception as e:
-            print(f"Errore calcolo possibilità: {e}")
-            return 0.5 
\ No newline at end of file
+    @staticmethod
+    def _parse_event_date(date_str: str) -> Optional[datetime]:
+        """
+        Converte la data evento (dd/mm/yyyy) in datetime, None se non valida.
+        Formato fisso: slicing diretto, senza il costo di strptime.
+        """
+        if not isinstance(date_str, str) or len(date_str) != 10 or date_str[2] != '/' or date_str[5] != '/':
+            return None
+        try:
+            return datetime(int(date_str[6:10]), int(date_str[3:5]), int(date_str[0:2]))
+        except ValueError:
+            return None
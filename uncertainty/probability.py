@@ -2,8 +2,15 @@
 Probabilità (Pr): valuta la forza del segnale ricevuto da MT4 indipendentemente dalla strategia che lo ha generato.
 """
 
+import logging
 from typing import Dict, Any
 import time
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Campi del segnale necessari al calcolo
+_REQUIRED_FIELDS = frozenset(('direction', 'strength', 'confidence'))
 
 class ProbabilityAnalyzer:
     """
@@ -29,11 +36,10 @@ class ProbabilityAnalyzer:
         Returns:
             Probabilità normalizzata [0,1]
         """
-        required_fields = ['direction', 'strength', 'confidence']
-        
         # Validazione campi
-        if not all(field in signal_data for field in required_fields):
-            print(f"Errore calcolo probabilità: Segnale deve contenere: {required_fields}")
+        if not _REQUIRED_FIELDS.issubset(signal_data):
+            metrics.incr(f"{self.__class__.__name__}.error")
+            logger.warning("Errore calcolo probabilità: Segnale deve contenere: %s", sorted(_REQUIRED_FIELDS))
             return 0.5  # valore neutro in caso di errore
             
         # Estrai valori
@@ -3,13 +3,37 @@ Affidabilità (A): combina i quattro indici di incertezza con pesi configurabili
 A = w1*Pr + w2*Pl + w3*Cr + w4*Po
 """
 
-from typing import Dict, Any
+import logging
+import functools
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from config.settings import TradingConfig
+from utils import metrics
 from .probability import ProbabilityAnalyzer
 from .plausibility import PlausibilityAnalyzer  
 from .credibility import CredibilityAnalyzer
 from .possibility import PossibilityAnalyzer
 
+logger = logging.getLogger(__name__)
+
+# Ordine degli indici, lo stesso di TradingConfig.WEIGHTS_ARRAY
+_INDEX_NAMES = ('probability', 'plausibility', 'credibility', 'possibility')
+
+# Analizzatori condivisi da tutti i segnali: client API e sessioni
+# vengono creati una sola volta per processo
+_PROBABILITY = ProbabilityAnalyzer()
+_CREDIBILITY = CredibilityAnalyzer()
+_POSSIBILITY = PossibilityAnalyzer()
+
+
+@functools.lru_cache(maxsize=16)
+def get_plausibility(timeframe: str) -> PlausibilityAnalyzer:
+    """Restituisce l'analizzatore di plausibilità condiviso per il timeframe del segnale."""
+    return PlausibilityAnalyzer(signal_timeframe=timeframe)
+
+
 class ReliabilityCalculator:
     """
     Calcola l'affidabilità combinando:
@@ -17,33 +41,55 @@ class ReliabilityCalculator:
     - Plausibilità (Pl): conferma da pattern tecnici
     - Credibilità (Cr): sentiment da notizie finanziarie
     - Possibilità (Po): assenza eventi macro destabilizzanti
+    
+    Non ha stato proprio: usa gli analizzatori condivisi a livello di modulo
+    e può essere istanziato una volta sola e riusato per tutti i segnali.
     """
     
-    def __init__(self, signal_data: Dict[str, Any]):
-        """Inizializza il calcolatore con i quattro analizzatori."""
-        self.probability_analyzer = ProbabilityAnalyzer()
-        self.plausibility_analyzer = PlausibilityAnalyzer(signal_timeframe=signal_data['timeframe'])
-        self.credibility_analyzer = CredibilityAnalyzer()
-        self.possibility_analyzer = PossibilityAnalyzer()
-        
-        # Carica i pesi da TradingConfig
-        self.weights = {
+    def __init__(self):
+        """Inizializza il calcolatore con i quattro analizzatori condivisi."""
+        self.probability_analyzer = _PROBABILITY
+        self.credibility_analyzer = _CREDIBILITY
+        self.possibility_analyzer = _POSSIBILITY
+    
+    # I pesi si leggono da TradingConfig a ogni uso, così valgono subito
+    # anche dopo TradingConfig.reload()
+    @property
+    def weights(self) -> Dict[str, float]:
+        """Pesi correnti dei quattro indici."""
+        return {
             'probability': TradingConfig.WEIGHT_PROBABILITY,
             'plausibility': TradingConfig.WEIGHT_PLAUSIBILITY,
             'credibility': TradingConfig.WEIGHT_CREDIBILITY,
             'possibility': TradingConfig.WEIGHT_POSSIBILITY
         }
+    
+    @property
+    def _weight_vec(self) -> np.ndarray:
+        """Stessi pesi come vettore [Pr, Pl, Cr, Po] per il prodotto scalare."""
+        return TradingConfig.WEIGHTS_ARRAY
         
-    def calculate_reliability(self, signal_data: Dict[str, Any]) -> Dict[str, float]:
+    def calculate_reliability(self, signal_data: Dict[str, Any],
+                              threshold: Optional[float] = None,
+                              now: Optional[datetime] = None) -> Dict[str, float]:
         """
         Calcola l'affidabilità combinando i quattro indici.
         
+        La probabilità viene calcolata per prima (non richiede I/O). Se è data
+        una soglia e nemmeno con Pl, Cr e Po al massimo (=1) l'affidabilità
+        potrebbe raggiungerla, gli altri indici non vengono calcolati: il risultato
+        ha 'short_circuited' True, None per gli indici non calcolati e per
+        'reliability', e il massimo raggiungibile in 'max_reliability'.
+        
         Args:
             signal_data: Dict contenente:
                 - direction: 'BUY', 'SELL' o 'HOLD'
                 - strength: forza segnale [0,1]
                 - confidence: confidenza strategia [0,1]
                 - ticker: simbolo del ticker
+                - timeframe: timeframe del segnale (es. '15m')
+            threshold: soglia di accettazione; None per calcolare sempre tutti gli indici
+            now: istante di riferimento comune a tutti gli analizzatori (default: datetime.now())
                 
         Returns:
             Dict con scores e affidabilità finale:
@@ -55,6 +101,8 @@ class ReliabilityCalculator:
                 'reliability': float,    # [0,1]
                 'weights': Dict[str, float]
             }
+            Con analisi interrotta Pl, Cr, Po e reliability sono None e sono
+            presenti 'max_reliability' (float) e 'short_circuited' (True).
         """
         try:
             # Validazione input
@@ -62,32 +110,39 @@ class ReliabilityCalculator:
                 raise ValueError("signal_data deve contenere 'ticker'")
             
             ticker = signal_data['ticker']
+            if now is None:
+                now = datetime.now()
+            
+            # Probabilità subito: serve a stimare il massimo raggiungibile
+            probability = self._calculate_probability(signal_data)
+            
+            if threshold is not None:
+                max_possible = (self.weights['probability'] * probability +
+                                self.weights['plausibility'] +
+                                self.weights['credibility'] +
+                                self.weights['possibility'])
+                if max_possible < threshold:
+                    logger.debug("Reliability massima %.3f sotto soglia %s per %s: analisi interrotta",
+                                 max_possible, threshold, ticker)
+                    return {
+                        'probability': probability,
+                        'plausibility': None,
+                        'credibility': None,
+                        'possibility': None,
+                        'reliability': None,
+                        'max_reliability': max_possible,
+                        'short_circuited': True,
+                        'weights': self.weights
+                    }
             
-            # Calcola i quattro indici
-            if self.weights['probability'] > 0:
-                probability = self.probability_analyzer.calculate_probability(signal_data)
-            else:
-                probability = 1
-            if self.weights['plausibility'] > 0:
-                plausibility = self.plausibility_analyzer.calculate_plausibility(ticker, signal_data['direction'])
-            else:
-                plausibility = 1
-            if self.weights['credibility'] > 0:
-                credibility = self.credibility_analyzer.calculate_credibility(ticker)
-            else:
-                credibility = 1
-            if self.weights['possibility'] > 0:
-                possibility = self.possibility_analyzer.calculate_possibility(ticker)
-            else:
-                possibility = 1
+            index_scores = self._calculate_context_indices(signal_data, now)
+            plausibility = index_scores['plausibility']
+            credibility = index_scores['credibility']
+            possibility = index_scores['possibility']
             
-            # Calcola affidabilità come somma pesata
-            reliability = (
-                self.weights['probability'] * probability +
-                self.weights['plausibility'] * plausibility +
-                self.weights['credibility'] * credibility +
-                self.weights['possibility'] * possibility
-            )
+            # Calcola affidabilità come somma pesata (prodotto scalare con i pesi)
+            scores = np.array([probability, plausibility, credibility, possibility], dtype=np.float64)
+            reliability = float(np.dot(scores, self._weight_vec))
             
             return {
                 'probability': probability,
@@ -98,8 +153,9 @@ class ReliabilityCalculator:
                 'weights': self.weights
             }
             
-        except Exception as e:
-            print(f"Errore nel calcolo affidabilità: {e}")
+        except Exception:
+            metrics.incr(f"{self.__class__.__name__}.error")
+            logger.exception("Errore nel calcolo affidabilità")
             return {
                 'probability': 0.5,
                 'plausibility': 0.5,
@@ -107,4 +163,84 @@ class ReliabilityCalculator:
                 'possibility': 0.5,
                 'reliability': 0.5,
                 'weights': self.weights
-            }
\ No newline at end of file
+            }
+
+    def calculate_reliability_batch(self, signal_data_list: List[Dict[str, Any]],
+                                    now: Optional[datetime] = None) -> List[Dict[str, float]]:
+        """
+        Calcola l'affidabilità di più segnali (es. backtest).
+        Gli indici vengono raccolti in una matrice N x 4 e combinati con i pesi
+        in un unico prodotto matrice-vettore.
+        
+        Args:
+            signal_data_list: segnali nel formato di calculate_reliability
+            now: istante di riferimento comune a tutti i segnali (default: datetime.now())
+            
+        Returns:
+            Lista di Dict come calculate_reliability, nello stesso ordine dei segnali
+        """
+        if not signal_data_list:
+            return []
+        if now is None:
+            now = datetime.now()
+        
+        rows = []
+        for signal_data in signal_data_list:
+            try:
+                index_scores = self._calculate_context_indices(signal_data, now)
+                index_scores['probability'] = self._calculate_probability(signal_data)
+                rows.append([index_scores[name] for name in _INDEX_NAMES])
+            except Exception:
+                metrics.incr(f"{self.__class__.__name__}.error")
+                logger.exception("Errore nel calcolo affidabilità per %s", signal_data.get('ticker'))
+                rows.append([0.5] * len(_INDEX_NAMES))
+        
+        scores = np.array(rows, dtype=np.float64)
+        reliabilities = scores @ self._weight_vec
+        
+        return [
+            {
+                **dict(zip(_INDEX_NAMES, row.tolist())),
+                'reliability': float(reliability),
+                'weights': self.weights
+            }
+            for row, reliability in zip(scores, reliabilities)
+        ]
+
+    def _calculate_probability(self, signal_data: Dict[str, Any]) -> float:
+        """Probabilità del segnale, 1 se il suo peso è nullo."""
+        if self.weights['probability'] > 0:
+            return self.probability_analyzer.calculate_probability(signal_data)
+        return 1
+
+    def _calculate_context_indices(self, signal_data: Dict[str, Any], now: datetime) -> Dict[str, float]:
+        """
+        Calcola plausibilità, credibilità e possibilità in parallelo (sono I/O-bound).
+        Gli indici con peso nullo non vengono calcolati e valgono 1.
+        """
+        ticker = signal_data['ticker']
+        plausibility_analyzer = get_plausibility(signal_data.get('timeframe', '15m'))
+        tasks = {
+            'plausibility': (plausibility_analyzer.calculate_plausibility, (ticker, signal_data['direction'])),
+            'credibility': (self.credibility_analyzer.calculate_credibility, (ticker,)),
+            'possibility': (self.possibility_analyzer.calculate_possibility, (ticker, now))
+        }
+        index_scores = {}
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = {
+                name: executor.submit(func, *args)
+                for name, (func, args) in tasks.items()
+                if self.weights[name] > 0
+            }
+            for name in tasks:
+                if name not in futures:
+                    index_scores[name] = 1
+                    continue
+                try:
+                    index_scores[name] = futures[name].result()
+                except Exception:
+                    # Un analizzatore fallito non invalida gli altri: valore neutro
+                    metrics.incr(f"{self.__class__.__name__}.{name}_error")
+                    logger.exception("Errore nel calcolo di %s", name)
+                    index_scores[name] = 0.5
+        return index_scores
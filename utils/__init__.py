@@ -1,17 +1,36 @@
 """
 Modulo utilities per il sistema di trading.
-Contiene client notizie finanziarie e analisi NLP.
+Contiene client notizie finanziarie, analisi NLP e cache delle API.
+
+Le classi sono importate alla prima richiesta (PEP 562): importare utils
+(es. per utils.metrics o utils.cache) non carica talib, yfinance, finnhub e openai.
 """
 
-from .finance_news import FinanceNews
-from .nlp_sentiment import NLPSentiment
-from .technical_analysis import TechnicalAnalyzer
-from .technical_analysis import Signal, PatternType
+import importlib
+
+_LAZY_IMPORTS = {
+    'FinanceNews': '.finance_news',
+    'NLPSentiment': '.nlp_sentiment',
+    'TechnicalAnalyzer': '.technical_analysis',
+    'Signal': '.technical_analysis',
+    'PatternType': '.technical_analysis',
+    'Pattern': '.technical_analysis',
+    'FileCache': '.cache'
+}
 
 __all__ = [
     'FinanceNews', 
     'NLPSentiment',
     'TechnicalAnalyzer',
     'Signal',
-    'PatternType'
-] 
\ No newline at end of file
+    'PatternType',
+    'Pattern',
+    'FileCache'
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
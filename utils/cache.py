@@ -0,0 +1,157 @@
+"""
+Cache su disco con scadenza (TTL) per le risposte delle API esterne.
+Ogni voce è salvata in .cache/<namespace>/<md5 dei parametri>.json come
+{"ts": ..., "data": ...}, con una copia in memoria (LRU limitata) per le
+letture ripetute.
+I valori restituiti sono copie: modificarli non altera la cache.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _copy_data(data: Any) -> Any:
+    """Copia profonda di dati JSON: dict e liste vengono copiati, gli scalari sono immutabili."""
+    if isinstance(data, dict):
+        return {key: _copy_data(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy_data(value) for value in data]
+    return data
+
+
+class FileCache:
+    """
+    Cache chiave/valore persistente su file JSON con TTL per voce.
+    Thread-safe: le scritture sono atomiche (file temporaneo + rename).
+    """
+
+    # Voci tenute in memoria oltre le quali si scartano le meno usate
+    MEMORY_MAXSIZE = 1024
+
+    def __init__(self, base_dir: str = '.cache', maxsize: int = MEMORY_MAXSIZE):
+        """
+        Args:
+            base_dir: directory radice della cache
+            maxsize: numero massimo di voci nella copia in memoria
+        """
+        self.base_dir = base_dir
+        self.maxsize = maxsize
+        self._memory: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, path: str, ts: float, data: Any):
+        """Inserisce una voce in memoria scartando la meno usata oltre maxsize (da chiamare con il lock)."""
+        self._memory[path] = (ts, data)
+        self._memory.move_to_end(path)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Calcola la chiave MD5 di parametri serializzabili in JSON."""
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.base_dir, namespace, f"{key}.json")
+
+    def get(self, namespace: str, key: str, ttl: float) -> Optional[Any]:
+        """
+        Restituisce il valore in cache se più recente di ttl secondi.
+
+        Returns:
+            Copia del dato salvato, oppure None se assente o scaduto
+        """
+        path = self._path(namespace, key)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(path)
+            if entry is not None:
+                if now - entry[0] < ttl:
+                    self._memory.move_to_end(path)
+                else:
+                    # Scaduta: si scarta e si rilegge il file, che un altro processo può aver aggiornato
+                    del self._memory[path]
+                    entry = None
+        if entry is not None:
+            return _copy_data(entry[1])
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if now - stored.get('ts', 0) >= ttl:
+            return None
+
+        with self._lock:
+            self._remember(path, stored['ts'], stored['data'])
+        return _copy_data(stored['data'])
+
+    def set(self, namespace: str, key: str, data: Any):
+        """Salva una copia di un valore serializzabile in JSON."""
+        path = self._path(namespace, key)
+        ts = time.time()
+
+        with self._lock:
+            self._remember(path, ts, _copy_data(data))
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'ts': ts, 'data': data}, f, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Impossibile scrivere cache %s: %s", path, e)
+
+    def clear(self):
+        """Svuota la copia in memoria (i file su disco scadono da soli)."""
+        with self._lock:
+            self._memory.clear()
+
+
+# Istanza condivisa tra tutti i client che non ne ricevono una esplicita
+DEFAULT_CACHE = FileCache()
+
+
+def cached(namespace: str, ttl: float) -> Callable:
+    """
+    Decoratore per metodi: memorizza il risultato in self.cache per ttl secondi.
+    I risultati vuoti (None, liste o dict vuoti, es. errori di rete) non vengono
+    salvati, i numeri sì anche se zero; ogni hit restituisce una copia
+    indipendente del risultato.
+
+    Args:
+        namespace: sottodirectory della cache (tipicamente l'endpoint)
+        ttl: durata di validità in secondi
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None:
+                return func(self, *args, **kwargs)
+
+            key = cache.make_key(func.__name__, args, kwargs)
+            hit = cache.get(namespace, key, ttl)
+            if hit is not None:
+                return hit
+
+            result = func(self, *args, **kwargs)
+            if result or (isinstance(result, (int, float)) and not isinstance(result, bool)):
+                cache.set(namespace, key, result)
+            return result
+        return wrapper
+    return decorator
@@ -4,28 +4,68 @@ Fornisce notizie specifiche per ticker azionari con filtraggio.
 """
 
 import os
+import re
+import functools
 import finnhub
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Pattern, Tuple
 from datetime import datetime, timedelta
 from .nlp_sentiment import NLPSentiment
+from .cache import FileCache, DEFAULT_CACHE, cached
 import investpy
 
+
+@functools.lru_cache(maxsize=4)
+def _get_finnhub_client(api_key: str) -> finnhub.Client:
+    """
+    Client Finnhub condiviso per API key: la requests.Session interna mantiene
+    le connessioni keep-alive tra le istanze di FinanceNews.
+    """
+    client = finnhub.Client(api_key=api_key)
+    # _session è un dettaglio interno di finnhub-python: se manca si usano i default
+    session = getattr(client, '_session', None)
+    if session is not None:
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+    return client
+
+
 class FinanceNews:
     """
     Classe per recuperare notizie aziendali da Finnhub API.
     Gestisce il recupero e filtraggio delle news per ticker azionari specifici.
     """
 
-    def __init__(self):
-        """Inizializza il client per le notizie aziendali usando finnhub-python."""
+    # Durata della cache (secondi) per le singole fonti
+    PROFILE_TTL = 30 * 24 * 3600
+    NEWS_TTL = 3600
+    CALENDAR_TTL = 6 * 3600
+    # Durata della cache (secondi) per i risultati già elaborati
+    TICKER_NEWS_TTL = 180
+    RELEVANT_EVENTS_TTL = 3600
+
+    def __init__(self, cache: Optional[FileCache] = None):
+        """
+        Inizializza il client per le notizie aziendali usando finnhub-python.
+
+        Args:
+            cache: cache condivisa delle risposte (default: DEFAULT_CACHE)
+        """
+        self.cache = cache if cache is not None else DEFAULT_CACHE
+        self.nlp = NLPSentiment(cache=self.cache)
+        # Info azienda già recuperate da questa istanza, per ticker (solo profili validi)
+        self._profile_cache: Dict[str, Dict[str, Any]] = {}
         self.api_key = os.getenv('FINNHUB_API_KEY')
 
         if not self.api_key:
             print("Warning: FINNHUB_API_KEY non trovata nelle variabili d'ambiente")
             self.finnhub_client = None
         else:
-            self.finnhub_client = finnhub.Client(api_key=self.api_key)
+            self.finnhub_client = _get_finnhub_client(self.api_key)
 
+    @cached('ticker_news', ttl=TICKER_NEWS_TTL)
     def get_ticker_news(self, ticker: str, max_items: int = 20) -> List[Dict]:
         """Recupera notizie per ticker (azioni o forex)."""
         try:
@@ -41,6 +81,7 @@ class FinanceNews:
             print(f"Errore recupero notizie per {ticker}: {e}")
             return []
 
+    @cached('economic_calendar', ttl=RELEVANT_EVENTS_TTL)
     def get_economic_calendar_news(self, ticker: str, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """
         Recupera eventi dal calendario economico usando investpy e analizza rilevanza per il ticker.
@@ -57,28 +98,32 @@ class FinanceNews:
             # Recupera eventi
             events = self._fetch_economic_calendar(start_date, end_date)
             
-            # Analizza rilevanza di ogni evento
-            nlp = NLPSentiment()
+            if not events:
+                return []
+            
+            # Analizza rilevanza di tutti gli eventi con prompt batch
             relevant_events = []
             
-            for event in events:
-                company_context = f"Company: {company_info['name']}, Industry: {company_info['industry']}, Sector: {company_info['industry']}"
-                event_text = f"Event: {event.get('event')}, Importance: {event.get('importance')}, Country: {event.get('zone')}, Forecast: {event.get('forecast')}"
-                
-                # Analizza rilevanza evento per il ticker
-                relevance = nlp.analyze_event_relevance(
-                    event_text=event_text,
-                    ticker=ticker,
-                    company_context=company_context
-                )
+            company_context = f"Company: {company_info['name']}, Industry: {company_info['industry']}, Sector: {company_info['industry']}"
+            event_texts = [
+                f"Event: {event.get('event')}, Importance: {event.get('importance')}, Country: {event.get('zone')}, Forecast: {event.get('forecast')}"
+                for event in events
+            ]
+            relevances = self.nlp.analyze_event_relevance_batch(
+                event_texts=event_texts,
+                ticker=ticker,
+                company_context=company_context
+            )
+            
+            for event, relevance in zip(events, relevances):
                 print(f"Economic Calendar Event:\n")
                 print(f"  └─ Economic Calendar Event: {event}")
                 # print(f"  └─ Company Context: {company_context}")
                 # print(f"  └─ Relevance: {relevance}")
                 
                 if relevance > 0.5:  # soglia minima rilevanza
-                    event['relevance_score'] = relevance
-                    relevant_events.append(event)
+                    # Copia: il calendario in cache è condiviso tra i ticker
+                    relevant_events.append(dict(event, relevance_score=relevance))
             
             # Ordina per rilevanza
             relevant_events.sort(key=lambda x: x['relevance_score'], reverse=True)
@@ -90,6 +135,7 @@ class FinanceNews:
             print(f"Errore analisi eventi per {ticker}: {e}")
             return []
         
+    @cached('investpy_calendar', ttl=CALENDAR_TTL)
     def _fetch_economic_calendar(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """
         Recupera il calendario economico usando investpy.
@@ -121,22 +167,22 @@ class FinanceNews:
                 importances=['high']
             )
 
-            # Converti il DataFrame in lista di dizionari
-            events = calendar.to_dict('records')
-
-            # Standardizza i nomi dei campi per mantenere compatibilità
-            standardized_events = []
-            for event in events:
-                if event.get('importance') is not None:
-                    standardized_event = {
-                        'event': event.get('event', ''),
-                        'country': event.get('zone', ''),
-                        'importance': event.get('importance', ''),
-                        'date': event.get('date', ''),
-                        'forecast': event.get('forecast', ''),
-                        'zone': event.get('zone', '')
-                    }
-                    standardized_events.append(standardized_event)
+            # Standardizza i nomi dei campi per mantenere compatibilità, iterando
+            # direttamente sulle righe (tuple) senza passare da to_dict('records')
+            standardized_events = [
+                {
+                    'event': event,
+                    'country': zone,
+                    'importance': importance,
+                    'date': date,
+                    'forecast': forecast,
+                    'zone': zone
+                }
+                for event, zone, importance, date, forecast in calendar[
+                    ['event', 'zone', 'importance', 'date', 'forecast']
+                ].itertuples(index=False, name=None)
+                if importance is not None
+            ]
 
             return standardized_events
 
@@ -154,22 +200,43 @@ class FinanceNews:
         Returns:
             Dizionario con info azienda
         """
+        company_info = self._profile_cache.get(ticker)
+        if company_info is not None:
+            return company_info
+
+        company_data = self._fetch_company_profile(ticker)
+        if not company_data:
+            return {'name': '', 'industry': '', 'industry': '', 'country': '', 'ticker': ticker, 'market_cap': 0}
+        company_info = {
+            'name': company_data.get('name', ''),
+            'industry': company_data.get('finnhubIndustry', ''),
+            'market_cap': company_data.get('marketCapitalization', 0),
+            'country': company_data.get('country', ''),
+            'ticker': ticker
+        }
+        self._profile_cache[ticker] = company_info
+        return company_info
+
+    @cached('finnhub_company_profile', ttl=PROFILE_TTL)
+    def _fetch_company_profile(self, ticker: str) -> Dict[str, Any]:
+        """
+        Recupera il profilo azienda da Finnhub (company_profile2).
+
+        Args:
+            ticker: Simbolo ticker azionario
+
+        Returns:
+            Profilo Finnhub, vuoto se non disponibile
+        """
         try:
             if not self.finnhub_client:
                 raise Exception("Finnhub client non inizializzato")
-            company_data = self.finnhub_client.company_profile2(symbol=ticker)
-            return {
-                'name': company_data.get('name', ''),
-                'industry': company_data.get('finnhubIndustry', ''),
-                'market_cap': company_data.get('marketCapitalization', 0),
-                'country': company_data.get('country', ''),
-                'ticker': ticker
-                
-            }
+            return self.finnhub_client.company_profile2(symbol=ticker) or {}
         except Exception as e:
             print(f"Impossibile recuperare info azienda per {ticker}: {e}")
-            return {'name': '', 'industry': '', 'industry': '', 'country': '', 'ticker': ticker, 'market_cap': 0}
+            return {}
 
+    @cached('finnhub_company_news', ttl=NEWS_TTL)
     def _fetch_company_news(self, ticker: str) -> List[Dict[str, Any]]:
         """
         Recupera notizie specifiche per l'azienda.
@@ -204,6 +271,24 @@ class FinanceNews:
             print(f"Errore recupero company news per {ticker}: {e}")
             return []
 
+    @cached('finnhub_general_news', ttl=NEWS_TTL)
+    def _fetch_general_news(self) -> List[Dict[str, Any]]:
+        """
+        Recupera le notizie generali di mercato (non filtrate) da Finnhub.
+
+        Returns:
+            Lista di notizie generali
+        """
+        try:
+            if not self.finnhub_client:
+                raise Exception("Finnhub client non inizializzato")
+            news_data = self.finnhub_client.general_news('general')
+            return news_data if isinstance(news_data, list) else []
+
+        except Exception as e:
+            print(f"Errore recupero general news: {e}")
+            return []
+
     def _fetch_general_market_news(self, ticker: str, company_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Recupera notizie generali di mercato filtrate per rilevanza.
@@ -215,31 +300,43 @@ class FinanceNews:
         Returns:
             Lista di notizie generali rilevanti
         """
+        return self._filter_general_market_news(self._fetch_general_news(), ticker, company_info)
+
+    def _filter_general_market_news(self, news_data: List[Dict[str, Any]], ticker: str,
+                                    company_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Filtra le notizie generali per data (ultimi 3 giorni) e rilevanza per il ticker.
+
+        Args:
+            news_data: Notizie generali da _fetch_general_news
+            ticker: Simbolo ticker azionario
+            company_info: Informazioni azienda
+
+        Returns:
+            Copie delle notizie rilevanti, con i metadata della fonte
+        """
         try:
-            if not self.finnhub_client:
-                raise Exception("Finnhub client non inizializzato")
-            # Calcola date range (ultimi 3 giorni per news generali)
+            # Calcola date range (ultimi 3 giorni per news generali) come
+            # timestamp, confrontabili direttamente con il campo 'datetime'
             end_date = datetime.now()
-            start_date = end_date - timedelta(days=3)
-
-            news_data = self.finnhub_client.general_news('general')
+            start_ts = (end_date - timedelta(days=3)).timestamp()
+            end_ts = end_date.timestamp()
 
-            # Filtra per data e rilevanza
+            # Filtra per data e rilevanza (parole chiave compilate una volta sola
+            # in un'unica regex, cercata in C invece che parola per parola)
+            keywords = self._relevance_pattern(ticker, company_info)
             relevant_news = []
             
             for item in news_data:
-                # Filtro per data
+                # Filtro per data, prima di qualsiasi elaborazione del testo
                 news_time = item.get('datetime')
-                if news_time:
-                    news_dt = datetime.fromtimestamp(news_time)
-                    if not (start_date <= news_dt <= end_date):
-                        continue
+                if news_time and not (start_ts <= news_time <= end_ts):
+                    continue
                     
-                if self._is_news_relevant_to_stock(item, ticker, company_info):
-                    # Aggiungi metadata per identificare fonte
-                    item['news_source'] = 'general_market'
-                    item['ticker_mentioned'] = ticker
-                    relevant_news.append(item)
+                if self._is_news_relevant_to_stock(item, keywords):
+                    # Aggiungi metadata per identificare fonte (su una copia:
+                    # la lista originale è condivisa dalla cache tra i ticker)
+                    relevant_news.append(dict(item, news_source='general_market', ticker_mentioned=ticker))
 
             return relevant_news
 
@@ -247,37 +344,54 @@ class FinanceNews:
             print(f"Errore recupero general news per {ticker}: {e}")
             return []
 
-    def _is_news_relevant_to_stock(self, news_item: Dict[str, Any], ticker: str, company_info: Dict[str, Any]) -> bool:
+    def _relevance_keywords(self, ticker: str, company_info: Dict[str, Any]) -> Tuple[str, ...]:
         """
-        Verifica se una notizia generale è rilevante per il ticker azionario.
+        Parole chiave (maiuscole) che rendono una notizia generale rilevante per il ticker.
+
+        Args:
+            ticker: Simbolo ticker
+            company_info: Informazioni azienda
+
+        Returns:
+            Ticker seguito dalle prime 3 parole significative del nome azienda
+        """
+        keywords = [ticker.upper()]
+
+        company_name = company_info.get('name', '').upper()
+        if company_name and len(company_name) > 3:
+            # Cerca nome azienda (almeno prime 3 parole significative)
+            name_words = [word for word in company_name.split() if len(word) > 3]
+            keywords.extend(name_words[:3])
+
+        return tuple(keywords)
+
+    def _relevance_pattern(self, ticker: str, company_info: Dict[str, Any]) -> Pattern[str]:
+        """
+        Regex che trova una qualsiasi delle parole chiave di _relevance_keywords.
 
         Args:
-            news_item: Dati della notizia
             ticker: Simbolo ticker
             company_info: Informazioni azienda
 
+        Returns:
+            Alternanza compilata delle parole chiave (come sottostringhe letterali)
+        """
+        return re.compile('|'.join(map(re.escape, self._relevance_keywords(ticker, company_info))))
+
+    def _is_news_relevant_to_stock(self, news_item: Dict[str, Any], keywords: Pattern[str]) -> bool:
+        """
+        Verifica se una notizia generale è rilevante per il ticker azionario.
+
+        Args:
+            news_item: Dati della notizia
+            keywords: Regex delle parole chiave da _relevance_pattern
+
         Returns:
             True se la notizia è rilevante per il titolo
         """
         try:
-            headline = news_item.get('headline', '').upper()
-            summary = news_item.get('summary', '').upper()
-            text = f"{headline} {summary}"
-
-            # 1. Controllo diretto ticker
-            if ticker.upper() in text:
-                return True
-
-            # 2. Controllo nome azienda
-            company_name = company_info.get('name', '').upper()
-            if company_name and len(company_name) > 3:
-                # Cerca nome azienda (almeno prime 3 parole significative)
-                name_words = [word for word in company_name.split() if len(word) > 3]
-                for word in name_words[:3]:  # Prime 3 parole significative
-                    if word in text:
-                        return True
-
-            return False
+            text = f"{news_item.get('headline', '')} {news_item.get('summary', '')}".upper()
+            return keywords.search(text) is not None
 
         except Exception:
             return False
@@ -344,18 +458,27 @@ class FinanceNews:
         try:
             print(f"Recupero notizie per azione {ticker}...")
 
-            # Ottiene info azienda per migliorare ricerca
-            company_info = self._get_company_info(ticker)
-
-            # Cerca notizie con diversi approcci
+            # Cerca notizie con diversi approcci: info azienda, news specifiche
+            # e news generali vengono scaricate in parallelo
             all_news = []
 
-            # 1. News specifiche per il ticker (max 15)
-            company_news = self._fetch_company_news(ticker)
-            all_news.extend(company_news[:max_items])
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                company_info_future = executor.submit(self._get_company_info, ticker)
+                company_news_future = executor.submit(self._fetch_company_news, ticker)
+                general_news_future = executor.submit(self._fetch_general_news)
 
-            # 2. News generali filtrate per rilevanza (max 15)
-            general_news = self._fetch_general_market_news(ticker, company_info)
+                # Ottiene info azienda per migliorare ricerca
+                company_info = company_info_future.result()
+
+                # News specifiche per il ticker (max 15)
+                company_news = company_news_future.result()
+
+                # News generali filtrate per rilevanza in locale (max 15)
+                general_news = self._filter_general_market_news(
+                    general_news_future.result(), ticker, company_info
+                )
+
+            all_news.extend(company_news[:max_items])
             all_news.extend(general_news[:max_items])
 
             print(f"Trovate {len(all_news)} notizie rilevanti per {ticker}")
@@ -0,0 +1,29 @@
+"""
+Contatori di processo per l'osservabilità del sistema (es. errori degli analizzatori).
+Thread-safe: incrementati dai thread Flask e dai worker degli analizzatori.
+"""
+
+import threading
+from collections import Counter
+from typing import Dict
+
+_counters: Counter = Counter()
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: int = 1):
+    """Incrementa il contatore name di amount."""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot() -> Dict[str, int]:
+    """Restituisce una copia dei contatori correnti."""
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    """Azzera tutti i contatori."""
+    with _lock:
+        _counters.clear()
@@ -1,12 +1,21 @@
 """
 Modulo per l'analisi del sentiment tramite modelli NLP.
 Utilizza DeepSeek o modelli Llama per valutare la polarità delle notizie.
+In alternativa (SENTIMENT_BACKEND=finbert) il sentiment è calcolato in locale
+con FinBERT; richiede i pacchetti opzionali torch e transformers.
 """
 
 import os
+import json
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 from openai import OpenAI
+from .cache import FileCache, DEFAULT_CACHE, cached
+
+logger = logging.getLogger(__name__)
 
 
 class SentimentMarketEventResponse(BaseModel):
@@ -22,27 +31,150 @@ class RelevanceEconomicCalendarEventResponse(BaseModel):
     score: float = Field(ge=0.0, le=1.0, description="Score di rilevanza da 0 a 1")
 
 
+FINBERT_MODEL = 'ProsusAI/finbert'
+
+# Messaggi di sistema e istruzioni dei prompt: le parti fisse precedono sempre
+# quelle variabili, così richieste successive condividono lo stesso prefisso
+# (riusato dalla cache dei prefissi lato provider)
+_SYSTEM_SENTIMENT = "Sei un analista finanziario esperto. Rispondi solo con un numero da -1 a +1."
+_SYSTEM_RELEVANCE = "Sei un analista finanziario esperto. Rispondi solo con un numero da 0 a 1."
+_SYSTEM_BATCH = "Sei un analista finanziario esperto. Rispondi solo con un array JSON di numeri, uno per testo, nello stesso ordine."
+
+_SENTIMENT_SCALE = """\
+-1 = Molto negativo (bearish, crolli, crisi, vendite massicce)
+-0.5 = Negativo (preoccupazioni, cali, incertezza)
+0 = Neutro (informativo, senza bias emotivo)
++0.5 = Positivo (ottimismo, crescita, opportunità)
++1 = Molto positivo (bullish, rally, boom, acquisti massicci)"""
+
+_RELEVANCE_SCALE = """\
+0 = Nessuna rilevanza (evento non correlato all'azienda o al suo settore)
+0.3 = Bassa rilevanza (impatto indiretto sul settore)
+0.6 = Media rilevanza (impatto diretto sul settore o indiretto sull'azienda)
+1.0 = Alta rilevanza (impatto diretto sull'azienda)"""
+
+_SENTIMENT_PROMPT = f"""\
+Analizza il sentiment del testo di notizia finanziaria indicato sotto e restituisci SOLO un numero da -1 a +1:
+
+{_SENTIMENT_SCALE}
+
+{{ticker_context}}Testo da analizzare:
+"{{text}}"
+
+Risposta (solo numero), da -1 a +1:"""
+
+_SENTIMENT_BATCH_PROMPT = f"""\
+Analizza il sentiment di ciascuno dei testi di notizie finanziarie indicati sotto.
+Per ogni testo assegna un numero da -1 a +1:
+
+{_SENTIMENT_SCALE}
+
+{{ticker_context}}Testi da analizzare ({{count}}):
+{{items}}
+
+Risposta (solo un array JSON di {{count}} numeri, nello stesso ordine dei testi):"""
+
+_RELEVANCE_PROMPT = f"""\
+Analizza quanto l'evento economico indicato sotto è rilevante per il titolo e restituisci SOLO un numero da 0 a 1 che rappresenta la rilevanza:
+
+{_RELEVANCE_SCALE}
+
+Considera:
+1. L'evento riguarda direttamente l'azienda?
+2. L'evento impatta il settore dell'azienda?
+3. L'evento ha effetti sul mercato in cui opera l'azienda?
+4. Ci sono correlazioni tra l'evento e il business model dell'azienda?
+
+Titolo: {{ticker}}
+Contesto Azienda:
+{{company_context}}
+
+Evento Economico:
+"{{event_text}}"
+
+Risposta (solo numero), da 0 a 1:"""
+
+_RELEVANCE_BATCH_PROMPT = f"""\
+Analizza quanto ciascuno degli eventi economici indicati sotto è rilevante per il titolo.
+Per ogni evento assegna un numero da 0 a 1 che rappresenta la rilevanza:
+
+{_RELEVANCE_SCALE}
+
+Titolo: {{ticker}}
+Contesto Azienda:
+{{company_context}}
+
+Eventi Economici ({{count}}):
+{{items}}
+
+Risposta (solo un array JSON di {{count}} numeri, nello stesso ordine degli eventi):"""
+
+
+@functools.lru_cache(maxsize=4)
+def _get_openai_client(api_key: str, base_url: str) -> OpenAI:
+    """Client OpenAI condiviso per credenziali: tutte le istanze riusano lo stesso pool di connessioni."""
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_finbert():
+    """
+    Carica tokenizer e modello FinBERT una sola volta per processo.
+
+    Returns:
+        (torch, tokenizer, model, indice classe positive, indice classe negative)
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(FINBERT_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(FINBERT_MODEL).eval()
+    label2id = {label.lower(): idx for label, idx in model.config.label2id.items()}
+    return torch, tokenizer, model, label2id['positive'], label2id['negative']
+
+
 class NLPSentiment:
     """
     Analizzatore di sentiment che utilizza API LLM per valutare
     la polarità emotiva dei testi finanziari.
+    Le risposte dell'LLM sono memorizzate su disco per prompt (temperatura 0).
+    Con backend 'finbert' il sentiment delle notizie è calcolato in locale;
+    la rilevanza degli eventi economici usa sempre l'LLM.
     """
     
-    def __init__(self):
+    # Durata della cache delle risposte LLM (secondi)
+    LLM_CACHE_TTL = 7 * 24 * 3600
+    
+    # Numero massimo di testi per prompt batch (limita la lunghezza del contesto)
+    BATCH_SIZE = 20
+    
+    # Token di output per uno score numerico (es. "-0.75")
+    SCORE_MAX_TOKENS = 8
+    
+    def __init__(self, cache: Optional[FileCache] = None):
         """
         Inizializza l'analizzatore NLP.
+
+        Args:
+            cache: cache condivisa delle risposte (default: DEFAULT_CACHE)
         """
+        self.cache = cache if cache is not None else DEFAULT_CACHE
         self.api_key = os.getenv('LLM_API_KEY')
         self.base_url = os.getenv('LLM_BASE_URL', 'https://api.deepseek.com')
         self.model_name = os.getenv('LLM_MODEL_NAME', 'deepseek-chat')
+        self.backend = os.getenv('SENTIMENT_BACKEND', 'llm').lower()
+        
+        if self.backend == 'finbert':
+            try:
+                _load_finbert()
+            except Exception as e:
+                logger.warning("FinBERT non disponibile (%s), uso backend LLM per il sentiment", e)
+                self.backend = 'llm'
         
         if not self.api_key:
             print("LLM_API_KEY non trovata nelle variabili d'ambiente")
         else:
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url
-            )
+            self.client = _get_openai_client(self.api_key, self.base_url)
     
     def analyze_sentiment(self, text: str, ticker: str = None) -> float:
         """
@@ -55,6 +187,9 @@ class NLPSentiment:
         Returns:
             Score sentiment da -1 (molto negativo) a +1 (molto positivo)
         """
+        if self.backend == 'finbert':
+            return self._finbert_scores([text])[0] if text.strip() else 0.0
+        
         if not self.api_key or not text.strip():
             return 0.0
         
@@ -62,19 +197,124 @@ class NLPSentiment:
             # Prompt ottimizzato per analisi sentiment finanziario
             prompt = self._create_sentiment_prompt(text, ticker)
             
-            # Chiamata all'API LLM
-            response = self._call_llm_sentiment_api(prompt)
-            
-            if response:
-                print(f"Risposta sentiment: {response}")
-                return float(response)
-            
-            return 0.0
+            # Chiamata all'API LLM (score validato e in cache)
+            score = self._llm_sentiment_score(prompt)
+            return score if score is not None else 0.0
             
         except Exception as e:
             print(f"Errore nell'analisi sentiment: {e}")
             return 0.0
     
+    def analyze_sentiment_batch(self, texts: List[str], ticker: str = None) -> List[float]:
+        """
+        Analizza il sentiment di più testi.
+        Un solo prompt ogni BATCH_SIZE testi; i gruppi partono in parallelo.
+        
+        Args:
+            texts: Testi da analizzare
+            ticker: Simbolo del titolo finanziario da analizzare
+            
+        Returns:
+            Lista di score sentiment da -1 a +1, nello stesso ordine dei testi
+        """
+        if not texts:
+            return []
+        
+        chunks = [texts[i:i + self.BATCH_SIZE] for i in range(0, len(texts), self.BATCH_SIZE)]
+        if self.backend == 'finbert':
+            return [score for chunk in chunks for score in self._finbert_scores(chunk)]
+        
+        if not self.api_key:
+            return [0.0] * len(texts)
+        
+        with ThreadPoolExecutor(max_workers=min(8, len(chunks))) as executor:
+            results = executor.map(lambda chunk: self._analyze_sentiment_chunk(chunk, ticker), chunks)
+            return [score for chunk_scores in results for score in chunk_scores]
+    
+    def _finbert_scores(self, texts: List[str]) -> List[float]:
+        """
+        Sentiment FinBERT di un gruppo di testi con un solo forward pass.
+        
+        Returns:
+            p(positive) - p(negative) per ogni testo, in [-1, 1]
+        """
+        torch, tokenizer, model, positive, negative = _load_finbert()
+        inputs = tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors='pt')
+        with torch.inference_mode():
+            probs = model(**inputs).logits.softmax(-1)
+        return (probs[:, positive] - probs[:, negative]).tolist()
+    
+    def _analyze_sentiment_chunk(self, texts: List[str], ticker: str = None) -> List[float]:
+        """
+        Sentiment di un gruppo di testi con un solo prompt.
+        Se la risposta non è valida analizza i testi uno per uno; se l'API non
+        risponde restituisce score neutri senza ripetere le chiamate per testo.
+        """
+        prompt = self._create_sentiment_batch_prompt(texts, ticker)
+        try:
+            scores = self._llm_batch_scores(prompt, len(texts), -1.0, 1.0)
+        except Exception as e:
+            logger.warning("Errore chiamata LLM API batch: %s", e)
+            return [0.0] * len(texts)
+        if scores is None:
+            logger.warning("Risposta sentiment batch non valida, analisi di %s testi singolarmente", len(texts))
+            return [self.analyze_sentiment(text, ticker) for text in texts]
+        return scores
+    
+    def _create_sentiment_batch_prompt(self, texts: List[str], ticker: str = None) -> str:
+        """
+        Crea il prompt per l'analisi sentiment di più testi numerati.
+        
+        Args:
+            texts: Testi da analizzare
+            ticker: Simbolo del titolo finanziario
+            
+        Returns:
+            Prompt formattato
+        """
+        items = "\n".join(f'Testo {i}: "{text}"' for i, text in enumerate(texts, 1))
+        return _SENTIMENT_BATCH_PROMPT.format(
+            ticker_context=f"Titolo: {ticker}\n" if ticker else "",
+            count=len(texts),
+            items=items
+        )
+    
+    @staticmethod
+    def _parse_score(response: Optional[str], low: float, high: float) -> Optional[float]:
+        """
+        Estrae lo score numerico da una risposta singola.
+        
+        Returns:
+            Score limitato a [low, high], None se la risposta non è un numero
+        """
+        if not response:
+            return None
+        try:
+            return min(high, max(low, float(response.strip())))
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _parse_scores(response: Optional[str], expected: int, low: float, high: float) -> Optional[List[float]]:
+        """
+        Estrae l'array JSON di score dalla risposta batch.
+        
+        Returns:
+            Score limitati a [low, high], None se la risposta non è un array di expected numeri
+        """
+        if not response:
+            return None
+        start, end = response.find('['), response.rfind(']')
+        if start < 0 or end < start:
+            return None
+        try:
+            values = json.loads(response[start:end + 1])
+            if not isinstance(values, list) or len(values) != expected:
+                return None
+            return [min(high, max(low, float(value))) for value in values]
+        except (TypeError, ValueError):
+            return None
+    
     def _create_sentiment_prompt(self, text: str, ticker: str = None) -> str:
         """
         Crea il prompt per l'analisi sentiment.
@@ -86,24 +326,31 @@ class NLPSentiment:
         Returns:
             Prompt formattato
         """
-        ticker_context = f"rispetto al titolo {ticker}" if ticker else ""
-        
-        prompt = f"""
-            Analizza il sentiment {ticker_context} del seguente testo di notizia finanziaria e restituisci SOLO un numero da -1 a +1:
-
-            -1 = Molto negativo (bearish, crolli, crisi, vendite massicce)
-            -0.5 = Negativo (preoccupazioni, cali, incertezza)
-            0 = Neutro (informativo, senza bias emotivo)
-            +0.5 = Positivo (ottimismo, crescita, opportunità)
-            +1 = Molto positivo (bullish, rally, boom, acquisti massicci)
-
-            Testo da analizzare:
-            "{text}"
-
-            Risposta (solo numero), da -1 a +1:
-            """
-        
-        return prompt
+        return _SENTIMENT_PROMPT.format(
+            ticker_context=f"Titolo: {ticker}\n" if ticker else "",
+            text=text
+        )
+    
+    # In cache solo gli score validati: una risposta troncata o non numerica
+    # non viene salvata e la richiesta successiva riprova l'API
+    @cached('llm_sentiment', ttl=LLM_CACHE_TTL)
+    def _llm_sentiment_score(self, prompt: str) -> Optional[float]:
+        """Score sentiment in [-1, 1] per il prompt, None se la risposta non è valida."""
+        response = self._call_llm_sentiment_api(prompt)
+        print(f"Risposta sentiment: {response}")
+        return self._parse_score(response, -1.0, 1.0)
+    
+    @cached('llm_relevance', ttl=LLM_CACHE_TTL)
+    def _llm_relevance_score(self, prompt: str) -> Optional[float]:
+        """Score di rilevanza in [0, 1] per il prompt, None se la risposta non è valida."""
+        response = self._call_llm_relevance_api(prompt)
+        print(f"Risposta rilevanza evento: {response}")
+        return self._parse_score(response, 0.0, 1.0)
+    
+    @cached('llm_batch', ttl=LLM_CACHE_TTL)
+    def _llm_batch_scores(self, prompt: str, expected: int, low: float, high: float) -> Optional[List[float]]:
+        """Score del prompt batch limitati a [low, high], None se la risposta non è valida."""
+        return self._parse_scores(self._call_llm_batch_api(prompt), expected, low, high)
     
     def _call_llm_sentiment_api(self, prompt: str) -> Optional[str]:
         """
@@ -119,11 +366,11 @@ class NLPSentiment:
             response = self.client.beta.chat.completions.parse(
                 model=self.model_name,
                 messages=[
-                    {"role": "system", "content": "Sei un analista finanziario esperto. Pensa step by step e restituisci la valutazione. Rispondi solo con un numero da -1 a +1."},
+                    {"role": "system", "content": _SYSTEM_SENTIMENT},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
-                temperature=0.5,
+                max_tokens=self.SCORE_MAX_TOKENS,
+                temperature=0,
                 # response_format=SentimentMarketEventResponse
             )
             
@@ -147,11 +394,11 @@ class NLPSentiment:
             response = self.client.beta.chat.completions.parse(
                 model=self.model_name,
                 messages=[
-                    {"role": "system", "content": "Sei un analista finanziario esperto. Pensa step by step e restituisci la valutazione. Rispondi solo con un numero da 0 a 1."},
+                    {"role": "system", "content": _SYSTEM_RELEVANCE},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
-                temperature=0.5,
+                max_tokens=self.SCORE_MAX_TOKENS,
+                temperature=0,
                 # response_format=RelevanceEconomicCalendarEventResponse
             )
             
@@ -161,6 +408,78 @@ class NLPSentiment:
             print(f"Errore chiamata LLM API: {e}")
             return None
 
+    def _call_llm_batch_api(self, prompt: str) -> Optional[str]:
+        """
+        Effettua chiamata all'API del modello LLM per un prompt con più testi.
+        
+        Args:
+            prompt: Prompt da inviare
+        Returns:
+            Risposta del modello (array JSON)
+        Raises:
+            Exception: errori di rete o dell'API, gestiti dal chiamante
+        """
+        response = self.client.beta.chat.completions.parse(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": _SYSTEM_BATCH},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=self.SCORE_MAX_TOKENS * self.BATCH_SIZE,
+            temperature=0,
+        )
+        
+        return response.choices[0].message.content
+
+    def analyze_event_relevance_batch(self, event_texts: List[str], ticker: str, company_context: str) -> List[float]:
+        """
+        Analizza la rilevanza di più eventi economici per un ticker.
+        Un solo prompt ogni BATCH_SIZE eventi; i gruppi partono in parallelo.
+        
+        Args:
+            event_texts: Testi degli eventi da analizzare
+            ticker: Simbolo del titolo
+            company_context: Informazioni contestuali sull'azienda
+            
+        Returns:
+            Lista di score di rilevanza da 0 a 1, nello stesso ordine degli eventi
+        """
+        if not event_texts:
+            return []
+        if not self.api_key:
+            return [0.0] * len(event_texts)
+        
+        chunks = [event_texts[i:i + self.BATCH_SIZE] for i in range(0, len(event_texts), self.BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=min(8, len(chunks))) as executor:
+            results = executor.map(
+                lambda chunk: self._analyze_event_relevance_chunk(chunk, ticker, company_context), chunks
+            )
+            return [score for chunk_scores in results for score in chunk_scores]
+    
+    def _analyze_event_relevance_chunk(self, event_texts: List[str], ticker: str, company_context: str) -> List[float]:
+        """
+        Rilevanza di un gruppo di eventi con un solo prompt.
+        Se la risposta non è valida analizza gli eventi uno per uno; se l'API non
+        risponde restituisce score nulli senza ripetere le chiamate per evento.
+        """
+        items = "\n".join(f'Evento {i}: "{text}"' for i, text in enumerate(event_texts, 1))
+        prompt = _RELEVANCE_BATCH_PROMPT.format(
+            ticker=ticker,
+            company_context=company_context,
+            count=len(event_texts),
+            items=items
+        )
+        
+        try:
+            scores = self._llm_batch_scores(prompt, len(event_texts), 0.0, 1.0)
+        except Exception as e:
+            logger.warning("Errore chiamata LLM API batch: %s", e)
+            return [0.0] * len(event_texts)
+        if scores is None:
+            logger.warning("Risposta rilevanza batch non valida, analisi di %s eventi singolarmente", len(event_texts))
+            return [self.analyze_event_relevance(text, ticker, company_context) for text in event_texts]
+        return scores
+
     def analyze_event_relevance(self, event_text: str, ticker: str, company_context: str) -> float:
         """
         Analizza quanto un evento economico è rilevante per un ticker.
@@ -177,33 +496,14 @@ class NLPSentiment:
             return 0.0
             
         try:
-            prompt = f"""
-            Analizza quanto il seguente evento economico è rilevante per il titolo {ticker}.
-            
-            Contesto Azienda:
-            {company_context}
-            
-            Evento Economico:
-            "{event_text}"
-            
-            Restituisci SOLO un numero da 0 a 1 che rappresenta la rilevanza:
-            0 = Nessuna rilevanza (evento non correlato all'azienda o al suo settore)
-            0.3 = Bassa rilevanza (impatto indiretto sul settore)
-            0.6 = Media rilevanza (impatto diretto sul settore o indiretto sull'azienda)
-            1.0 = Alta rilevanza (impatto diretto sull'azienda)
-            
-            Pensa step by step:
-            1. L'evento riguarda direttamente l'azienda?
-            2. L'evento impatta il settore dell'azienda?
-            3. L'evento ha effetti sul mercato in cui opera l'azienda?
-            4. Ci sono correlazioni tra l'evento e il business model dell'azienda?
-            
-            Risposta (solo numero), da 0 a 1:
-            """
+            prompt = _RELEVANCE_PROMPT.format(
+                ticker=ticker,
+                company_context=company_context,
+                event_text=event_text
+            )
             
-            response = self._call_llm_relevance_api(prompt)
-            print(f"Risposta rilevanza evento: {response}")
-            return float(response) if response else 0.0
+            score = self._llm_relevance_score(prompt)
+            return score if score is not None else 0.0
             
         except Exception as e:
             print(f"Errore analisi rilevanza evento: {e}")
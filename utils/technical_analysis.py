@@ -3,12 +3,20 @@ Utility per analisi tecnica e pattern recognition.
 Usa TA-Lib per pattern candlestick e yfinance per i dati di mercato.
 """
 
+import logging
 import talib
+import talib.abstract
+import talib.stream
 import numpy as np
+import pandas as pd
 import yfinance as yf
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from enum import Enum
+from dataclasses import dataclass
+from .cache import FileCache, DEFAULT_CACHE
+
+logger = logging.getLogger(__name__)
 
 class Signal(Enum):
     """Enum per i possibili segnali."""
@@ -23,50 +31,124 @@ class PatternType(Enum):
     NEUTRAL = "neutral"
     NONE = "none"
 
+# Mapping forex: coppia -> simbolo Yahoo Finance
+_YAHOO_FOREX_MAPPING = {
+    'GBPUSD': 'GBPUSD=X',
+    'EURUSD': 'EURUSD=X',
+    'USDJPY': 'USDJPY=X',
+    'USDCHF': 'USDCHF=X',
+    'AUDUSD': 'AUDUSD=X',
+    'USDCAD': 'USDCAD=X',
+    'NZDUSD': 'NZDUSD=X'
+}
+
+# Tipi di pattern indicizzati per valore (come salvati negli array delle occorrenze)
+_PATTERN_TYPES = {pattern_type.value: pattern_type for pattern_type in PatternType}
+
+
+@dataclass(slots=True)
+class Pattern:
+    """Occorrenza di un pattern candlestick."""
+    name: str
+    type: PatternType
+    position: int
+    strength: float
+    date: np.datetime64
+
+
 class TechnicalAnalyzer:
     """Analizzatore tecnico per pattern candlestick."""
     
-    # Pattern supportati con relativi pesi
-    BULLISH_PATTERNS = {
+    # Pattern supportati con relativi pesi: ogni funzione TA-Lib viene chiamata
+    # una sola volta, il segno del risultato distingue bullish (>0) e bearish (<0)
+    PATTERNS = {
         'CDLENGULFING': (talib.CDLENGULFING, 1.0),
         'CDLMORNINGSTAR': (talib.CDLMORNINGSTAR, 1.0),
         'CDLHAMMER': (talib.CDLHAMMER, 1.0),
         'CDLPIERCING': (talib.CDLPIERCING, 1.0),
-        'CDLMARUBOZU': (talib.CDLMARUBOZU, 1.0)
-    }
-    
-    BEARISH_PATTERNS = {
-        'CDLENGULFING': (talib.CDLENGULFING, 1.0),
+        'CDLMARUBOZU': (talib.CDLMARUBOZU, 1.0),
         'CDLEVENINGSTAR': (talib.CDLEVENINGSTAR, 1.0),
         'CDLSHOOTINGSTAR': (talib.CDLSHOOTINGSTAR, 1.0),
-        'CDLDARKCLOUDCOVER': (talib.CDLDARKCLOUDCOVER, 1.0),
-        'CDLMARUBOZU': (talib.CDLMARUBOZU, 1.0)
+        'CDLDARKCLOUDCOVER': (talib.CDLDARKCLOUDCOVER, 1.0)
     }
+    
+    # Stessi pattern in forma vettoriale, indicizzati come le righe della matrice dei risultati
+    _PATTERN_FUNCS = tuple(func for func, _ in PATTERNS.values())
+    _STREAM_FUNCS = tuple(getattr(talib.stream, name) for name in PATTERNS)
+    _PATTERN_NAMES = np.array(list(PATTERNS))
+    _PATTERN_WEIGHTS = np.array([weight for _, weight in PATTERNS.values()], dtype=np.float64)
+    
+    # Candele precedenti richieste da ogni pattern: con N <= lookback candele
+    # TA-Lib restituisce solo zeri e la chiamata viene saltata
+    _PATTERN_LOOKBACKS = np.array([talib.abstract.Function(name).lookback for name in PATTERNS])
+    
+    # Occorrenze dei pattern: una riga per occorrenza, 'type' è il valore di PatternType
+    PATTERN_DTYPE = np.dtype([
+        ('name', 'U20'),
+        ('type', 'U10'),
+        ('position', 'i4'),
+        ('strength', 'f8'),
+        ('date', 'M8[ns]')
+    ])
+    
+    # Durata in secondi di una candela: i download restano in cache per una candela
+    INTERVAL_SECONDS = {
+        "1m": 60, "5m": 300, "15m": 900, "30m": 1800,
+        "1h": 3600, "4h": 14400, "1d": 86400
+    }
+    
+    # Periodo minimo da scaricare per intervallo
+    DOWNLOAD_PERIODS = {
+        "1m": "5d", "5m": "60d", "15m": "60d",
+        "30m": "60d", "1h": "730d", "4h": "730d", "1d": "2y"
+    }
+    
+    # Colonne OHLCV salvate in cache
+    OHLCV_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+    
+    # Numero massimo di simboli per richiesta yfinance (limite URL di Yahoo)
+    DOWNLOAD_BATCH_SIZE = 20
+    
+    # Età massima (secondi) di un download in cache aggiornabile scaricando solo
+    # le candele nuove; oltre si riscarica l'intero periodo (Yahoo conserva
+    # le candele da 1m solo per 7 giorni)
+    DELTA_MAX_AGE = 7 * 24 * 3600
 
     def __init__(self, 
                  interval: str = "15m",
-                 context_lookback: int = 20):  # candele totali per contesto
+                 context_lookback: int = 20,  # candele totali per contesto
+                 cache: Optional[FileCache] = None):
         """
         Args:
             interval: intervallo temporale ('1d', '1h', etc.)
             context_lookback: candele totali per contesto
+            cache: cache dei download yfinance (default: DEFAULT_CACHE)
         """
         self.interval = interval
         self.context_lookback = context_lookback
+        self.cache = cache if cache is not None else DEFAULT_CACHE
 
     def _get_market_data(self, ticker: str):
         """Recupera dati di mercato con supporto forex."""
         try:
             # Converte ticker forex per yfinance
             yahoo_ticker = self._convert_to_yahoo_format(ticker)
+            period = self._download_period()
             
-            period_map = {
-                "1m": "5d", "5m": "60d", "15m": "60d", 
-                "30m": "60d", "1h": "730d", "4h": "730d", "1d": "2y"
-            }
-            period = period_map.get(self.interval, "60d")
+            # Dati già scaricati nell'ultima candela: nessuna richiesta HTTP
+            df = self._get_cached_frame(yahoo_ticker)
+            if df is not None:
+                return df
             
-            print(f"Download dati per {ticker} → {yahoo_ticker}")
+            # Download precedente non più recente: si scaricano solo le candele nuove
+            cached_df = self._get_cached_frame(yahoo_ticker, max_age=self.DELTA_MAX_AGE)
+            if cached_df is not None:
+                df = self._download_delta(yahoo_ticker, cached_df)
+                if df is not None:
+                    self._set_cached_frame(yahoo_ticker, df)
+                    return df
+            
+            logger.info("Download dati per %s → %s", ticker, yahoo_ticker)
             df = yf.download(
                 yahoo_ticker, 
                 period=period, 
@@ -76,29 +158,88 @@ class TechnicalAnalyzer:
             )
             
             if df.empty:
-                print(f"Nessun dato trovato per {ticker}")
+                logger.warning("Nessun dato trovato per %s", ticker)
                 return None
             
+            self._set_cached_frame(yahoo_ticker, df)
             return df
             
         except Exception as e:
-            print(f"Errore recupero dati {ticker}: {e}")
+            logger.error("Errore recupero dati %s: %s", ticker, e)
+            return None
+
+    def _frame_cache_key(self, yahoo_ticker: str) -> str:
+        """Chiave di cache del download: ticker, intervallo e periodo."""
+        return self.cache.make_key(yahoo_ticker, self.interval, self._download_period())
+
+    def _get_cached_frame(self, yahoo_ticker: str, max_age: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        Restituisce il DataFrame OHLCV in cache se scaricato da meno di max_age secondi.
+
+        Args:
+            yahoo_ticker: simbolo Yahoo
+            max_age: età massima del download (default: durata di una candela)
+
+        Returns:
+            DataFrame con le colonne OHLCV e indice datetime (UTC), None se assente o scaduto
+        """
+        if max_age is None:
+            max_age = self.INTERVAL_SECONDS.get(self.interval, 60)
+        stored = self.cache.get('yfinance', self._frame_cache_key(yahoo_ticker), max_age)
+        if stored is None:
             return None
+        return pd.DataFrame(
+            {column: stored[column] for column in self.OHLCV_COLUMNS},
+            index=pd.to_datetime(np.array(stored['index'], dtype='M8[ns]'))
+        )
+
+    def _set_cached_frame(self, yahoo_ticker: str, df: pd.DataFrame):
+        """Salva in cache le colonne OHLCV del download (date come nanosecondi UTC)."""
+        stored = {'index': df.index.values.astype('M8[ns]').astype(np.int64).tolist()}
+        for column in self.OHLCV_COLUMNS:
+            stored[column] = df[column].to_numpy(dtype=np.float64).ravel().tolist()
+        self.cache.set('yfinance', self._frame_cache_key(yahoo_ticker), stored)
+
+    def _download_delta(self, yahoo_ticker: str, cached_df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Aggiorna un download in cache scaricando solo le candele dall'ultima salvata
+        in poi (l'ultima viene riscaricata: poteva essere ancora in formazione).
+
+        Args:
+            yahoo_ticker: simbolo Yahoo
+            cached_df: DataFrame OHLCV da _get_cached_frame
+
+        Returns:
+            DataFrame aggiornato con lo stesso numero di candele (scarta le più vecchie),
+            None se il download non restituisce dati
+        """
+        start = pd.Timestamp(cached_df.index[-1], tz='UTC')
+        logger.info("Download candele di %s dal %s", yahoo_ticker, start)
+        delta = yf.download(
+            yahoo_ticker,
+            start=start.to_pydatetime(),
+            interval=self.interval,
+            progress=False,
+            auto_adjust=False
+        )
+        if delta is None or delta.empty:
+            return None
+
+        # Stesso formato della cache: colonne OHLCV e date UTC senza fuso
+        delta = pd.DataFrame(
+            {column: delta[column].to_numpy(dtype=np.float64).ravel() for column in self.OHLCV_COLUMNS},
+            index=pd.DatetimeIndex(delta.index.values)
+        )
+        merged = pd.concat([cached_df[cached_df.index < delta.index[0]], delta])
+        return merged.iloc[-len(cached_df):]
+
+    def _download_period(self) -> str:
+        """Periodo minimo da scaricare per l'intervallo configurato."""
+        return self.DOWNLOAD_PERIODS.get(self.interval, "60d")
 
     def _convert_to_yahoo_format(self, ticker: str) -> str:
         """Converte ticker per formato Yahoo Finance."""
-        # Mapping forex
-        forex_mapping = {
-            'GBPUSD': 'GBPUSD=X',
-            'EURUSD': 'EURUSD=X', 
-            'USDJPY': 'USDJPY=X',
-            'USDCHF': 'USDCHF=X',
-            'AUDUSD': 'AUDUSD=X',
-            'USDCAD': 'USDCAD=X',
-            'NZDUSD': 'NZDUSD=X'
-        }
-        
-        return forex_mapping.get(ticker, ticker)
+        return _YAHOO_FOREX_MAPPING.get(ticker, ticker)
 
     def get_candles(self, ticker: str) -> Optional[Dict]:
         """
@@ -116,49 +257,134 @@ class TechnicalAnalyzer:
             if df is None:
                 return None
 
-            # Prendi solo le ultime N candele necessarie per l'analisi
-            df = df.tail(self.context_lookback)
-            
-            print(f"Recuperate {len(df)} candele {self.interval} per {ticker}")
-            
-            # Verifica che abbiamo abbastanza candele
-            if len(df) < self.context_lookback:
-                print(f"Warning: Recuperate solo {len(df)} candele delle {self.context_lookback} richieste")
-                
-            data = {
-                'open': df['Open'].values,
-                'high': df['High'].values,
-                'low': df['Low'].values,
-                'close': df['Close'].values,
-                'volume': df['Volume'].values,
-                'dates': df.index.values
-            }
-
-            arrays = ['open', 'high', 'low', 'close', 'volume']
-
-            # Controlla che tutti abbiano stessa lunghezza
-            lengths = [len(data[key]) for key in arrays]
-            if len(set(lengths)) > 1:
-                print(f"Array con lunghezze diverse: {dict(zip(arrays, lengths))}")
-                return []
-
-            import numpy as np
-            for key in arrays:
-                # Assicura che sia numpy array 1D float64
-                data[key] = np.array(data[key], dtype=np.float64).flatten()
-                # Rimuovi NaN e infiniti
-                data[key] = np.nan_to_num(data[key], nan=0.0, posinf=0.0, neginf=0.0)
-
-            # print(f"Validazione OK: {len(data['open'])} candele")
-            # print(f"Array info: open={data['open'].shape} {data['open'].dtype}")
-
-            return data
+            return self._frame_to_candles(df, ticker)
 
         except Exception as e:
-            print(f"Errore recupero dati per {ticker}: {e}")
+            logger.error("Errore recupero dati per %s: %s", ticker, e)
             return None
 
-    def detect_patterns(self, ticker: str) -> List[Dict]:
+    def get_candles_batch(self, tickers: List[str]) -> Dict[str, Dict]:
+        """
+        Recupera le ultime N candele OHLCV di più ticker con un download ogni
+        DOWNLOAD_BATCH_SIZE simboli (yfinance scarica i ticker in parallelo
+        sulla stessa sessione HTTP).
+
+        Args:
+            tickers: simboli dei ticker
+
+        Returns:
+            Dizionario ticker -> arrays OHLCV come get_candles; i ticker senza dati sono omessi
+        """
+        if not tickers:
+            return {}
+
+        yahoo_tickers = {ticker: self._convert_to_yahoo_format(ticker) for ticker in tickers}
+        
+        # I ticker già in cache non vengono riscaricati
+        frames = {}
+        for yahoo_ticker in yahoo_tickers.values():
+            cached_df = self._get_cached_frame(yahoo_ticker)
+            if cached_df is not None:
+                frames[yahoo_ticker] = cached_df
+        to_download = [t for t in dict.fromkeys(yahoo_tickers.values()) if t not in frames]
+        
+        for i in range(0, len(to_download), self.DOWNLOAD_BATCH_SIZE):
+            frames.update(self._download_batch(to_download[i:i + self.DOWNLOAD_BATCH_SIZE]))
+
+        candles = {}
+        for ticker, yahoo_ticker in yahoo_tickers.items():
+            ticker_df = frames.get(yahoo_ticker)
+            if ticker_df is None:
+                logger.warning("Nessun dato trovato per %s", ticker)
+                continue
+            try:
+                data = self._frame_to_candles(ticker_df, ticker)
+                if data:
+                    candles[ticker] = data
+            except Exception as e:
+                logger.error("Errore recupero dati per %s: %s", ticker, e)
+
+        return candles
+
+    def _download_batch(self, yahoo_tickers: List[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Scarica più ticker Yahoo con una sola chiamata yfinance e salva ognuno in cache.
+
+        Args:
+            yahoo_tickers: simboli Yahoo distinti
+
+        Returns:
+            Dizionario simbolo Yahoo -> DataFrame OHLCV; i simboli senza dati sono omessi
+        """
+        try:
+            logger.info("Download dati per %s ticker", len(yahoo_tickers))
+            df = yf.download(
+                yahoo_tickers,
+                period=self._download_period(),
+                interval=self.interval,
+                group_by='ticker',
+                threads=True,
+                progress=False,
+                auto_adjust=False
+            )
+        except Exception as e:
+            logger.error("Errore recupero dati %s: %s", yahoo_tickers, e)
+            return {}
+
+        frames = {}
+        for yahoo_ticker in yahoo_tickers:
+            try:
+                ticker_df = df[yahoo_ticker] if df.columns.nlevels > 1 else df
+                # Le righe senza dati (orari di mercato diversi tra ticker) vengono scartate
+                ticker_df = ticker_df.dropna(how='all')
+                if ticker_df.empty:
+                    continue
+                self._set_cached_frame(yahoo_ticker, ticker_df)
+                frames[yahoo_ticker] = ticker_df
+            except Exception as e:
+                logger.error("Errore recupero dati per %s: %s", yahoo_ticker, e)
+
+        return frames
+
+    def _frame_to_candles(self, df, ticker: str) -> Optional[Dict]:
+        """Converte il DataFrame yfinance di un ticker nel dizionario di arrays OHLCV."""
+        # Converte solo le ultime N righe dello storico (fino a 730 giorni)
+        columns = list(self.OHLCV_COLUMNS)
+        window = df.iloc[-self.context_lookback:]
+        prices = window[columns].to_numpy(dtype=np.float64)
+        dates = window.index.values
+        
+        # Candele incomplete (prezzi NaN) scartate prima di prendere le ultime N:
+        # azzerate, TA-Lib le riconoscerebbe come pattern inesistenti
+        if np.isnan(prices[:, :4]).any():
+            prices = df[columns].to_numpy(dtype=np.float64)
+            keep = np.flatnonzero(~np.isnan(prices[:, :4]).any(axis=1))[-self.context_lookback:]
+            prices, dates = prices[keep], df.index.values[keep]
+        
+        logger.debug("Recuperate %s candele %s per %s", len(prices), self.interval, ticker)
+        
+        # Verifica che abbiamo abbastanza candele
+        if len(prices) < self.context_lookback:
+            logger.warning("Recuperate solo %s candele delle %s richieste", len(prices), self.context_lookback)
+            
+        # Un solo buffer (5, N) float64 C-contiguo e scrivibile: ogni riga è una
+        # vista contigua su una colonna OHLCV, passabile a TA-Lib senza copie
+        ohlcv = np.array(prices.T, order='C')
+        # Volume mancante (es. forex): non usato dai pattern, vale 0
+        np.nan_to_num(ohlcv[4], copy=False)
+
+        data = {
+            'open': ohlcv[0],
+            'high': ohlcv[1],
+            'low': ohlcv[2],
+            'close': ohlcv[3],
+            'volume': ohlcv[4],
+            'dates': dates
+        }
+
+        return data
+
+    def detect_patterns(self, ticker: str) -> List[Pattern]:
         """
         Rileva pattern candlestick per un ticker.
 
@@ -168,76 +394,159 @@ class TechnicalAnalyzer:
         Returns:
             Lista di pattern trovati con tipo e posizione
         """
+        return self.to_patterns(self.detect_pattern_hits(ticker))
+
+    def detect_pattern_hits(self, ticker: str) -> np.ndarray:
+        """
+        Rileva pattern candlestick per un ticker senza creare un dizionario per occorrenza.
+
+        Args:
+            ticker: simbolo del ticker
+
+        Returns:
+            Array strutturato (PATTERN_DTYPE), nello stesso ordine di detect_patterns:
+            bullish, bearish e infine doji
+        """
         # Recupera dati
         data = self.get_candles(ticker)
+        if not data:
+            return np.empty(0, dtype=self.PATTERN_DTYPE)
+
+        # Risultati di tutti i pattern in una matrice K x N (righe a zero per
+        # i pattern che richiedono più candele di quelle disponibili)
+        ohlc = (data['open'], data['high'], data['low'], data['close'])
+        results = np.zeros((len(self._PATTERN_FUNCS), len(data['close'])), dtype=np.int32)
+        for k in np.flatnonzero(self._PATTERN_LOOKBACKS < len(data['close'])).tolist():
+            results[k] = self._PATTERN_FUNCS[k](*ohlc)
+
+        # Pattern neutri (doji), calcolati su tutte le candele in blocco
+        return self._pattern_hits(results, self._is_doji(*ohlc), data['dates'])
+
+    def detect_latest_patterns(self, ticker: str) -> List[Pattern]:
+        """
+        Rileva i pattern candlestick della sola ultima candela (uso in tempo reale).
+        Ogni pattern è valutato con talib.stream, che calcola solo l'ultimo valore
+        invece dell'intero storico.
+
+        Args:
+            ticker: simbolo del ticker
+
+        Returns:
+            Pattern dell'ultima candela, nello stesso ordine di detect_patterns
+        """
+        data = self.get_candles(ticker)
         if not data:
             return []
 
-        patterns = []
-        
-        # Pattern bullish
-        for name, (func, weight) in self.BULLISH_PATTERNS.items():
-            result = func(data['open'], data['high'], data['low'], data['close'])
-            for i, value in enumerate(result):
-                if value > 0:
-                    patterns.append({
-                        'name': name,
-                        'type': PatternType.BULLISH,
-                        'position': i,
-                        'strength': weight,
-                        'date': data['dates'][i]
-                    })
-
-        # Pattern bearish
-        for name, (func, weight) in self.BEARISH_PATTERNS.items():
-            result = func(data['open'], data['high'], data['low'], data['close'])
-            for i, value in enumerate(result):
-                if value < 0:
-                    patterns.append({
-                        'name': name,
-                        'type': PatternType.BEARISH,
-                        'position': i,
-                        'strength': weight,
-                        'date': data['dates'][i]
-                    })
-
-        # Pattern neutri (doji)
-        for i in range(len(data['open'])):
-            if self._is_doji(
-                data['open'][i],
-                data['high'][i],
-                data['low'][i],
-                data['close'][i]
-            ):
-                patterns.append({
-                    'name': 'DOJI',
-                    'type': PatternType.NEUTRAL,
-                    'position': i,
-                    'strength': 0.5,
-                    'date': data['dates'][i]
-                })
-
-        return patterns
-
-    def _is_doji(self, open: float, high: float, low: float, close: float) -> bool:
-        """Verifica se una candela è un doji."""
-        body = abs(close - open)
+        ohlc = (data['open'], data['high'], data['low'], data['close'])
+        last = len(data['close']) - 1
+
+        # Da TA-Lib 0.6 le funzioni stream restituiscono un oggetto con il valore in .value
+        results = np.zeros((len(self._STREAM_FUNCS), 1), dtype=np.int32)
+        for k in np.flatnonzero(self._PATTERN_LOOKBACKS < len(data['close'])).tolist():
+            result = self._STREAM_FUNCS[k](*ohlc)
+            results[k, 0] = getattr(result, 'value', result)
+        doji_mask = np.atleast_1d(self._is_doji(*(values[last] for values in ohlc)))
+
+        return self.to_patterns(self._pattern_hits(results, doji_mask, data['dates'], first_position=last))
+
+    def _pattern_hits(self, results: np.ndarray, doji_mask: np.ndarray, dates: np.ndarray,
+                      first_position: int = 0) -> np.ndarray:
+        """
+        Costruisce l'array strutturato delle occorrenze dagli array dei risultati,
+        senza cicli Python per occorrenza.
+
+        Args:
+            results: matrice K x M dei risultati TA-Lib (una riga per pattern di PATTERNS)
+            doji_mask: maschera doji delle stesse M candele
+            dates: date di tutte le candele
+            first_position: posizione della prima delle M candele
+
+        Returns:
+            Array strutturato (PATTERN_DTYPE): bullish, bearish e infine doji
+        """
+        # Un'unica scansione in C restituisce (pattern, candela) di ogni occorrenza
+        pattern_ids, columns = np.nonzero(results)
+        is_bullish = results[pattern_ids, columns] > 0
+
+        # Bullish prima dei bearish, mantenendo l'ordine (pattern, candela)
+        order = np.argsort(~is_bullish, kind='stable')
+        pattern_ids, columns, is_bullish = pattern_ids[order], columns[order], is_bullish[order]
+        doji_columns = np.flatnonzero(doji_mask)
+
+        n = len(columns)
+        hits = np.empty(n + len(doji_columns), dtype=self.PATTERN_DTYPE)
+        hits['name'][:n] = self._PATTERN_NAMES[pattern_ids]
+        hits['type'][:n] = np.where(is_bullish, PatternType.BULLISH.value, PatternType.BEARISH.value)
+        hits['position'][:n] = columns + first_position
+        hits['strength'][:n] = self._PATTERN_WEIGHTS[pattern_ids]
+        hits['name'][n:] = 'DOJI'
+        hits['type'][n:] = PatternType.NEUTRAL.value
+        hits['position'][n:] = doji_columns + first_position
+        hits['strength'][n:] = 0.5
+        hits['date'] = dates[hits['position']]
+
+        return hits
+
+    def to_patterns(self, hits: np.ndarray) -> List[Pattern]:
+        """
+        Converte le occorrenze di detect_pattern_hits nei Pattern di detect_patterns.
+
+        Args:
+            hits: array strutturato (PATTERN_DTYPE)
+
+        Returns:
+            Lista di Pattern, nello stesso ordine delle occorrenze
+        """
+        types = _PATTERN_TYPES
+        return [
+            Pattern(name, types[pattern_type], position, strength, date)
+            for name, pattern_type, position, strength, date in zip(
+                hits['name'].tolist(), hits['type'].tolist(), hits['position'].tolist(),
+                hits['strength'].tolist(), hits['date']
+            )
+        ]
+
+    def _is_doji(self, open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        """Maschera delle candele doji (accetta anche scalari)."""
+        body = np.abs(close - open)
         return body <= 0.1 * (high - low)
 
-    def format_pattern(self, pattern: Dict) -> str:
+    def format_pattern(self, pattern: Pattern) -> str:
         """
         Formatta un pattern per il logging.
         
         Args:
-            pattern: dizionario del pattern
+            pattern: occorrenza del pattern
 
         Returns:
             Stringa formattata del pattern
         """
         # Converti numpy.datetime64 in stringa YYYY-MM-DD
-        date_str = str(pattern['date']).split('T')[0]
+        date_str = str(pattern.date).split('T')[0]
         
-        return (f"{pattern['name']}: "
-                f"{pattern['type'].value} "
-                f"(strength={pattern['strength']:.2f}, "
+        return (f"{pattern.name}: "
+                f"{pattern.type.value} "
+                f"(strength={pattern.strength:.2f}, "
                 f"date={date_str})")
+
+    def format_patterns(self, patterns: List[Pattern]) -> List[str]:
+        """
+        Formatta più pattern per il logging, come format_pattern ma convertendo
+        tutte le date in stringhe YYYY-MM-DD con un'unica chiamata.
+
+        Args:
+            patterns: occorrenze dei pattern
+
+        Returns:
+            Stringhe formattate, nello stesso ordine dei pattern
+        """
+        if not patterns:
+            return []
+        dates = np.datetime_as_string(
+            np.array([pattern.date for pattern in patterns], dtype='datetime64[D]'), unit='D'
+        )
+        return [
+            f"{pattern.name}: {pattern.type.value} (strength={pattern.strength:.2f}, date={date_str})"
+            for pattern, date_str in zip(patterns, dates.tolist())
+        ]
@@ -0,0 +1,16 @@
+"""
+Entry point WSGI per eseguire il server con un application server di produzione.
+
+Linux/macOS:
+    gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Windows:
+    waitress-serve --threads=8 --listen=0.0.0.0:5000 wsgi:app
+
+Usare un solo processo worker: app_state è in memoria e la connessione IBKR
+usa un unico IBKR_CLIENT_ID, quindi la concorrenza va ottenuta con i thread.
+"""
+
+from server import app
+
+__all__ = ['app']